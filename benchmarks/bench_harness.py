@@ -0,0 +1,366 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as apisure  # noqa: E402
+from helpers.output import configure_output, print_info  # noqa: E402
+from utils.codec import JSON_LIBRARIES, JsonCodec  # noqa: E402
+from utils.report import HtmlReporter, JUnitReporter, NdjsonReporter  # noqa: E402
+from utils.request import make_request  # noqa: E402
+from utils.session import configure_sessions  # noqa: E402
+from utils.snapshot import SnapshotStore  # noqa: E402
+from utils.transport import configure_transport, http2_available  # noqa: E402
+from utils.validation import (compile_assertions, compile_schema, validate_content, validate_content_type,  # noqa: E402
+                              validate_schema)
+
+ITEM_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'id': {'type': 'integer'},
+        'name': {'type': 'string'},
+        'address': {
+            'type': 'object',
+            'properties': {'street': {'type': 'string'}, 'city': {'type': 'string'}},
+            'required': ['street', 'city']
+        }
+    },
+    'required': ['id', 'name', 'address']
+}
+LIST_SCHEMA = {'type': 'array', 'items': ITEM_SCHEMA}
+
+
+def build_items(size: int) -> List[Dict[str, Any]]:
+    return [{'id': position, 'name': f"user {position}",
+             'address': {'street': f"{position} Main St", 'city': 'Springfield'}} for position in range(size)]
+
+
+STUB_BODIES: Dict[str, bytes] = {}
+
+
+def stub_response(path: str) -> Tuple[bytes, str]:
+    # Precomputed bodies, so the stub costs as little as possible per request
+    parts = urlsplit(path)
+    if parts.path == '/items':
+        size = int(parse_qs(parts.query).get('n', ['10'])[0])
+        key = f"items-{size}"
+        if key not in STUB_BODIES:
+            STUB_BODIES[key] = json.dumps(build_items(size)).encode()
+        return STUB_BODIES[key], 'application/json'
+    if parts.path == '/html':
+        return b'<html><body>stub</body></html>', 'text/html'
+    return b'{"id": 1, "name": "stub", "address": {"street": "1 Main St", "city": "x"}}', 'application/json'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in one write; separate small writes would stall on delayed ACKs
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        body, content_type = stub_response(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.do_GET()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def serve_h2_connection(sock: socket.socket) -> None:
+    # Imported here, h2 is only installed with the optional HTTP/2 support
+    import h2.config
+    import h2.connection
+    import h2.events
+
+    connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+    connection.initiate_connection()
+    # Response bodies still waiting for flow control window, by stream
+    pending: Dict[int, bytes] = {}
+    paths: Dict[int, str] = {}
+
+    def send_pending() -> None:
+        for stream_id in list(pending):
+            data = pending[stream_id]
+            window = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+            while data and window > 0:
+                connection.send_data(stream_id, data[:window])
+                data = data[window:]
+                window = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+            if data:
+                pending[stream_id] = data
+            else:
+                connection.end_stream(stream_id)
+                del pending[stream_id]
+
+    with sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(connection.data_to_send())
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    paths[event.stream_id] = dict(event.headers)[':path']
+                elif isinstance(event, h2.events.DataReceived):
+                    connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    body, content_type = stub_response(paths.pop(event.stream_id))
+                    connection.send_headers(event.stream_id, [(':status', '200'), ('content-type', content_type),
+                                                              ('content-length', str(len(body)))])
+                    pending[event.stream_id] = body
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            send_pending()
+            sock.sendall(connection.data_to_send())
+
+
+@contextlib.contextmanager
+def h2_stub_server():
+    # Cleartext HTTP/2 (h2c) with prior knowledge, answering like the HTTP/1.1 stub
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def accept() -> None:
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve_h2_connection, args=(sock,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    finally:
+        listener.close()
+
+
+def per_call(function: Callable[[], Any], number: int, repeat: int) -> float:
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def quiet(function: Callable[[], Any]) -> Callable[[], Any]:
+    # The terminal output is part of the harness cost, but a real terminal would make the numbers unstable
+    def run() -> Any:
+        with open(os.devnull, 'w') as devnull:
+            configure_output('text', color=True, stream=devnull)
+            try:
+                return function()
+            finally:
+                configure_output()
+    return run
+
+
+def bench_requests(base_url: str, number: int, repeat: int) -> Dict[str, float]:
+    url = f"{base_url}/user"
+    case = {'method': 'GET', 'url': url, 'expected_status': 200, 'expected_schema': ITEM_SCHEMA}
+    results = dict.fromkeys(('pass', 'fail', 'executed', 'total_time', 'total_length', 'length_count', 'compared',
+                             'regressions', 'throttled_time'), 0)
+    session = requests.Session()
+    configure_sessions()
+
+    def full_case() -> None:
+        response, _ = apisure.send_test_case(dict(case), None)
+        apisure.process_response(1, case, response, False, results)
+
+    raw = per_call(lambda: session.get(url).content, number, repeat)
+    request_layer = per_call(lambda: make_request('GET', url), number, repeat)
+    case_time = per_call(quiet(full_case), number, repeat)
+    return {
+        'raw_request_us': raw * 1e6,
+        'make_request_us': request_layer * 1e6,
+        'full_case_us': case_time * 1e6,
+        'harness_overhead_us': (case_time - raw) * 1e6,
+    }
+
+
+def bench_throughput(base_url: str, cases: int, concurrency: int, http2: bool = False) -> Dict[str, float]:
+    test_cases = [{'method': 'GET', 'url': f"{base_url}/user?case={position}", 'expected_status': 200,
+                   'expected_schema': ITEM_SCHEMA} for position in range(cases)]
+    configure_sessions(max(10, concurrency))
+    configure_transport(http2, max(10, concurrency), prior_knowledge=http2)
+    try:
+        started = time.perf_counter()
+        quiet(lambda: apisure.run_test_cases(test_cases, False, concurrency=concurrency, reporters=[]))()
+        elapsed = time.perf_counter() - started
+    finally:
+        configure_transport()
+    return {f"throughput_{'h2_' if http2 else ''}c{concurrency}_cases_per_s": cases / elapsed}
+
+
+def bench_validators(size: int, repeat: int) -> Dict[str, float]:
+    payload = build_items(size)
+    validator = compile_schema(LIST_SCHEMA)
+    assertions = compile_assertions({'$[*].id': {'type': 'integer', '>=': 0}, '$[*].name': {'type': 'string'},
+                                     '$[*].address.city': 'Springfield'})
+    first = payload[0]
+    # Like the expectations of a test case, the same objects on every call
+    expected_content = {'id': 0, 'name': 'user 0'}
+    expected_types = {'id': int, 'name': str}
+    return {
+        f"validate_schema_{size}_ms": per_call(lambda: [validate_schema(item, ITEM_SCHEMA) for item in payload],
+                                               1, repeat) * 1e3,
+        f"compiled_schema_{size}_ms": per_call(lambda: validator.validate(payload), 1, repeat) * 1e3,
+        'validate_content_us': per_call(lambda: validate_content(first, expected_content), 1000, repeat) * 1e6,
+        'validate_content_type_us': per_call(lambda: validate_content_type(first, expected_types), 1000,
+                                             repeat) * 1e6,
+        f"assertions_{size}_ms": per_call(lambda: assertions.validate(payload), 1, repeat) * 1e3,
+    }
+
+
+def bench_json(size: int, repeat: int) -> Dict[str, float]:
+    # requests' own response.json() decodes the body to text first; the codecs decode the bytes
+    payload = json.dumps(build_items(size)).encode()
+    value = json.loads(payload)
+    response = requests.Response()
+    response._content = payload
+    response.encoding = 'utf-8'
+    metrics = {f"response_json_{size}_ms": per_call(response.json, 1, repeat) * 1e3}
+    for library in JSON_LIBRARIES:
+        codec = JsonCodec(library)
+        metrics[f"json_decode_{library}_{size}_ms"] = per_call(lambda: codec.loads(payload), 1, repeat) * 1e3
+        metrics[f"json_pretty_{library}_{size}_ms"] = per_call(lambda: codec.dumps_pretty(value), 1, repeat) * 1e3
+    return metrics
+
+
+def bench_snapshots(size: int, repeat: int) -> Dict[str, float]:
+    payload = build_items(size)
+    case = {'method': 'GET', 'url': 'http://127.0.0.1/items'}
+    with tempfile.TemporaryDirectory() as directory:
+        snapshots = SnapshotStore(directory, ignore_paths=['$[*].address.street'])
+        snapshots.check(case, payload)
+        return {f"snapshot_match_{size}_ms": per_call(lambda: snapshots.check(case, payload), 1, repeat) * 1e3}
+
+
+def bench_reports(cases: int, repeat: int) -> Dict[str, float]:
+    test_case = {
+        'id': 1, 'description': 'Benchmark case', 'method': 'GET', 'url': 'http://127.0.0.1/user', 'passed': True,
+        'status_code': 200, 'expected_status': 200, 'response_time': '1.00 ms', 'response_seconds': 0.001,
+        'content_length': '80.00 B', 'timing': 'DNS 0.00 ms', 'timings': [{'attempt': 1, 'total': 0.001}],
+        'validation_results': [{'passed': True, 'warning': True, 'message': 'Response time exceeds threshold'}]
+    }
+    summary = {'total_tests': cases, 'executed_tests': cases, 'pass': cases, 'fail': 0,
+               'avg_response_time': '1.00 ms', 'avg_content_length': '80.00 B', 'connection_reuse': '',
+               'totals': {}, 'connections': {}}
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, reporter_class in (('html', HtmlReporter), ('junit', JUnitReporter), ('ndjson', NdjsonReporter)):
+            def write_report() -> None:
+                reporter = reporter_class(os.path.join(directory, f"report.{name}"))
+                reporter.start()
+                for position in range(cases):
+                    reporter.add_test_case(dict(test_case, id=position + 1))
+                reporter.finish(summary)
+            metrics[f"report_{name}_us_per_case"] = per_call(quiet(write_report), 1, repeat) / cases * 1e6
+    return metrics
+
+
+def bench_output(number: int, repeat: int) -> Dict[str, float]:
+    return {'print_info_us': per_call(quiet(lambda: [print_info('Label', 'value') for _ in range(number)]), 1,
+                                      repeat) / number * 1e6}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(metrics: Dict[str, float], previous_file: str) -> List[Tuple[str, float, float]]:
+    with open(previous_file, 'r') as file:
+        previous = json.load(file)['metrics']
+    return [(name, previous[name], value) for name, value in metrics.items() if name in previous]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure ApiSure's own overhead against an in-process stub server.")
+    parser.add_argument('--requests', type=int, default=500, help='Requests per timed run (default: 500).')
+    parser.add_argument('--cases', type=int, default=2000, help='Test cases in the throughput run (default: 2000).')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8],
+                        help='Concurrency levels of the throughput run (default: 1 8).')
+    parser.add_argument('--size', type=int, default=50000,
+                        help='Number of array elements in the validator payload (default: 50000).')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs, the best is kept (default: 3).')
+    parser.add_argument('--http2', action='store_true',
+                        help='Also measure throughput over HTTP/2 against an h2c stub (needs httpx[http2]).')
+    parser.add_argument('--output', help='Write the results as JSON to this path.')
+    parser.add_argument('--compare', metavar='PREVIOUS', help='Compare with results written earlier by --output.')
+    args = parser.parse_args()
+    if args.http2 and not http2_available():
+        parser.error("--http2 needs httpx with HTTP/2 support: pip install 'httpx[http2]'")
+
+    metrics: Dict[str, float] = {}
+    with stub_server() as base_url:
+        metrics.update(bench_requests(base_url, args.requests, args.repeat))
+        for concurrency in args.concurrency:
+            metrics.update(bench_throughput(base_url, args.cases, concurrency))
+    if args.http2:
+        with h2_stub_server() as base_url:
+            for concurrency in args.concurrency:
+                metrics.update(bench_throughput(base_url, args.cases, concurrency, http2=True))
+    metrics.update(bench_validators(args.size, args.repeat))
+    metrics.update(bench_json(args.size, args.repeat))
+    metrics.update(bench_snapshots(args.size, args.repeat))
+    metrics.update(bench_reports(args.cases, args.repeat))
+    metrics.update(bench_output(args.requests * 10, args.repeat))
+
+    for name, value in metrics.items():
+        print(f"{name:<40} {value:12.2f}")
+
+    if args.compare:
+        print(f"\nChange against {args.compare} (lower is better, except throughput)")
+        for name, before, after in compare(metrics, args.compare):
+            change = (after - before) / before if before else 0
+            print(f"{name:<40} {before:12.2f} -> {after:12.2f} {change:+8.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'metrics': metrics
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
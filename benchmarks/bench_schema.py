@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import timeit
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.validation import compile_schema, validate_schema  # noqa: E402
+
+SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'id': {'type': 'integer'},
+            'name': {'type': 'string'},
+            'address': {
+                'type': 'object',
+                'properties': {'street': {'type': 'string'}, 'city': {'type': 'string'}},
+                'required': ['street', 'city']
+            },
+            'tags': {
+                'type': 'array',
+                'items': {'type': 'object', 'properties': {'label': {'type': 'string'}}, 'required': ['label']}
+            }
+        },
+        'required': ['id', 'name', 'address']
+    }
+}
+
+
+def build_payload(size: int) -> List[Dict[str, Any]]:
+    return [{
+        'id': position,
+        'name': f"user {position}",
+        'address': {'street': f"{position} Main St", 'city': 'Springfield'},
+        'tags': [{'label': 'a'}, {'label': 'b'}]
+    } for position in range(size)]
+
+
+def validate_every_item(payload: List[Dict[str, Any]]) -> None:
+    # What checking every element costs with the recursive validator
+    for item in payload:
+        validate_schema(item, SCHEMA['items'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare the compiled schema validator with validate_schema.')
+    parser.add_argument('--size', type=int, default=50000, help='Number of array elements (default: 50000).')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs (default: 5).')
+    args = parser.parse_args()
+
+    payload = build_payload(args.size)
+    validator = compile_schema(SCHEMA)
+
+    timings = {
+        'validate_schema (first element only)': lambda: validate_schema(payload, SCHEMA),
+        'validate_schema (every element)': lambda: validate_every_item(payload),
+        'compile_schema + validate (cached)': lambda: compile_schema(SCHEMA).validate(payload),
+        'SchemaValidator.validate': lambda: validator.validate(payload),
+    }
+
+    print(f"{args.size} elements, best of {args.repeat} runs")
+    for label, function in timings.items():
+        best = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        print(f"{label:<40} {best * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,164 @@
-from typing import Any
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional
 
-from colorama import Fore, Style
+from colorama import Fore, Style, just_fix_windows_console
+
+from utils.profiling import profile_stage
+
+OUTPUT_MODES = ('text', 'quiet', 'ndjson')
+FLUSH_INTERVAL = 0.2
+BUFFER_SIZE = 64 * 1024
+
+
+class Console:
+    """
+    Buffered, thread-safe terminal output.
+
+    Lines are collected in memory and written in batches by a background thread every :data:`FLUSH_INTERVAL`
+    seconds (or sooner once :data:`BUFFER_SIZE` characters are waiting), so a large suite does not pay for one write
+    per line. ``quiet`` mode holds back the lines of each test case and only prints them if the case fails;
+    ``ndjson`` mode prints one JSON event per line instead of text.
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, mode: str = 'text', color: Optional[bool] = None) -> None:
+        self._stream = stream
+        self.mode = mode
+        self.color = color if color is not None else self._supports_color()
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        # Lines of the test case being checked on this thread, held back in quiet mode
+        self._local = threading.local()
+
+    @property
+    def stream(self) -> IO[str]:
+        # Looked up on every use, so redirecting sys.stdout still works
+        return self._stream if self._stream is not None else sys.stdout
+
+    def _supports_color(self) -> bool:
+        if 'NO_COLOR' in os.environ:
+            return False
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+    def line(self, level: str, text: str, color: str = '') -> None:
+        if self.mode == 'ndjson':
+            if level in ('warning', 'error'):
+                self.event('log', {'level': level, 'message': text})
+            return
+
+        if self.color and color:
+            text = f"{color}{text}{Style.RESET_ALL}"
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            held.append(text)
+        elif self.mode == 'quiet' and level == 'warning':
+            # Outside a test case these are retry notices; the final error is still shown
+            return
+        else:
+            self.write(text + '\n')
+
+    def event(self, event_type: str, data: Dict[str, Any]) -> None:
+        if self.mode == 'ndjson':
+            self.write(json.dumps({'type': event_type, **data}, default=str) + '\n')
+
+    def start_case(self) -> None:
+        if self.mode == 'quiet':
+            self._local.held = []
+
+    def finish_case(self, passed: bool) -> None:
+        held = getattr(self._local, 'held', None)
+        self._local.held = None
+        if held and not passed:
+            self.write('\n'.join(held) + '\n')
+
+    def write(self, text: str) -> None:
+        with self._lock:
+            self._buffer.append(text)
+            self._buffered += len(text)
+            if self._buffered >= BUFFER_SIZE:
+                self._flush()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name='apisure-output', daemon=True)
+                self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._buffer:
+                self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with profile_stage('output'):
+            if self._buffer:
+                self.stream.write(''.join(self._buffer))
+                self._buffer = []
+                self._buffered = 0
+            self.stream.flush()
+
+
+_console = Console()
+atexit.register(lambda: _console.flush())
+
+
+def configure_output(mode: str = 'text', color: Optional[bool] = None, stream: Optional[IO[str]] = None) -> Console:
+    global _console
+    _console.flush()
+    _console = Console(stream, mode, color)
+    if _console.color:
+        just_fix_windows_console()
+    return _console
+
+
+def get_console() -> Console:
+    return _console
+
+
+def flush_output() -> None:
+    _console.flush()
 
 
 def print_colored(color: str, text: str) -> None:
-    print(f"{color}{text}{Style.RESET_ALL}")
+    _console.line('info', text, color)
 
 
 def print_header(text: str) -> None:
-    print_colored(Fore.CYAN + Style.BRIGHT, f"\n{'=' * 50}\n {text}\n{'=' * 50}")
+    _console.line('header', f"\n{'=' * 50}\n {text}\n{'=' * 50}", Fore.CYAN + Style.BRIGHT)
 
 
 def print_info(label: str, value: Any) -> None:
-    print_colored(Fore.GREEN, f"{label}: {value}")
+    _console.line('info', f"{label}: {value}", Fore.GREEN)
 
 
 def print_warning(text: str) -> None:
-    print_colored(Fore.YELLOW, text)
+    _console.line('warning', text, Fore.YELLOW)
 
 
 def print_error(text: str) -> None:
-    print_colored(Fore.RED, text)
+    _console.line('error', text, Fore.RED)
+
+
+def print_raw(text: str) -> None:
+    _console.write(text)
+
+
+def print_event(event_type: str, data: Dict[str, Any]) -> None:
+    _console.event(event_type, data)
+
+
+def start_case() -> None:
+    _console.start_case()
+
+
+def finish_case(passed: bool) -> None:
+    _console.finish_case(passed)
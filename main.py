@@ -1,273 +1,931 @@
-from utils.request import make_request
-from utils.validation import validate_schema, validate_content, validate_content_type, validate_headers
-from utils.report import generate_html_report
-from helpers.output import print_header, print_info, print_warning, print_error
+from utils.request import RequestFailure, make_request
+from utils.load import run_load_test, load_summary
+from utils.scheduler import CaseScheduler
+from utils.shard import parse_shard, select_shard, merge_partials
+from utils.cassette import configure_cassette
+from utils.session import configure_sessions
+from utils.transport import configure_transport, get_transport
+from utils.ratelimit import configure_rate_limiter, parse_limit
+from utils.retry import configure_circuit_breaker
+from utils.history import DEFAULT_HISTORY_FILE, configure_history, get_history, close_history
+from utils.result_cache import DEFAULT_CACHE_FILE, CachedResult, case_hash, configure_result_cache, get_result_cache
+from utils.timing import format_timing, check_timing_budget
+from utils.validation import (InvalidAssertion, compile_assertions, compile_schema, validate_content,
+                              validate_content_type, validate_headers)
+from utils.report import Reporter, HtmlReporter, JUnitReporter, NdjsonReporter, write_reports
+from utils.loader import load_test_cases
+from utils.templates import TemplateError, expand_test_cases
+from utils.snapshot import DEFAULT_SNAPSHOT_DIR, configure_snapshots, get_snapshots
+from utils.profiling import StageProfiler, configure_profiler, get_profiler, profile_iteration, profile_stage
+from utils.metrics import MetricsReporter
+from utils.body import DEFAULT_MAX_BODY_SIZE, is_spilled, body_preview, iter_json_array_body, json_body
+from utils.codec import JSON_LIBRARIES, configure_json, json_dumps_pretty
+from helpers.output import (OUTPUT_MODES, configure_output, finish_case, flush_output, print_error, print_event,
+                            print_header, print_info, print_raw, print_warning, start_case)
 from helpers.formatting import format_size, format_time
 
 import argparse
-from typing import Dict, Any
-from colorama import init
+import cProfile
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple, Union
 import json
+import os
+import requests
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
 
-init()
+VALID_METHODS = {'GET', 'POST', 'PUT', 'DELETE', 'PATCH'}
+MAX_FAILING_PATHS = 10
 
 
-def run_test_cases(test_cases: list[Dict[str, Any]], show_response: bool, verify_ssl: bool = True) -> None:
-    cookies = None
-    valid_methods = {'GET', 'POST', 'PUT', 'DELETE', 'PATCH'}
-    time_threshold = 2
-
-    results = {
+def new_results() -> Dict[str, Any]:
+    # The running totals check_response adds to, shared by suite and load runs
+    return {
         'pass': 0,
         'fail': 0,
+        'executed': 0,
         'total_time': 0,
         'total_length': 0,
         'length_count': 0,
-        'test_cases': []
+        'compared': 0,
+        'regressions': 0,
+        'cached': 0,
+        'throttled_time': 0
     }
-    total_tests = len(test_cases)
-    executed_tests = 0
 
-    for index, case in enumerate(test_cases, start=1):
-        if case.get('skip', False):
-            print_header(f"Test Case {index} is skipped.")
-            total_tests -= 1
-            continue
 
-        method = case['method']
-        url = case['url']
-        headers = case.get('headers', {})
-        json_data = case.get('json')
-        params = case.get('params')
-        expected_status = case.get('expected_status')
-        expected_schema = case.get('expected_schema')
-        expected_headers = case.get('expected_headers', {})
-        forbidden_headers = case.get('forbidden_headers', [])
-        expected_response = case.get('expected_response', {})
-        expected_content = case.get('expected_content', {})
-        expected_types = case.get('expected_types', {})
-        retry_count = case.get('retry_count', 3)
-        retry_delay = case.get('retry_delay', 2000) / 1000
-        timeout = case.get('timeout')
-
-        if method not in valid_methods:
-            print_error(f"Invalid HTTP method: {method}")
-            continue
+def send_test_case(case: Dict[str, Any], cookies: Optional[str], verify_ssl: bool = True,
+                   max_body_size: int = DEFAULT_MAX_BODY_SIZE
+                   ) -> Tuple[Union[requests.Response, RequestFailure, None], Optional[str]]:
+    if case.get('skip', False) or case['method'] not in VALID_METHODS:
+        return None, cookies
 
-        if cookies:
-            headers.update({'Cookie': cookies})
+    headers = dict(case.get('headers', {}))
+    if cookies:
+        headers.update({'Cookie': cookies})
 
-        print_header(f"Test Case {index}: {method} {url}")
+    response = make_request(case['method'], case['url'], headers=headers, json=case.get('json'),
+                            params=case.get('params'), retries=case.get('retry_count', 3),
+                            delay=case.get('retry_delay', 2000) / 1000, timeout=case.get('timeout'),
+                            verify_ssl=verify_ssl, max_body_size=case.get('max_body_size', max_body_size),
+                            expected_status=case.get('expected_status'), tags=case.get('tags'))
 
-        test_case_result = {
-            'id': index,
-            'description': case.get('description', f"Test Case {index}"),
-            'method': method,
-            'url': url,
-            'passed': True,
-            'validation_results': []
-        }
+    # Cookies only carry over from a 200 response that also passed the status check
+    expected_status = case.get('expected_status')
+    if (isinstance(response, requests.Response) and response.status_code == 200 and 'Set-Cookie' in response.headers
+            and (not expected_status or expected_status == 200)):
+        cookies = response.headers['Set-Cookie']
+    return response, cookies
 
-        response = make_request(method, url, headers=headers, json=json_data, params=params,
-                                retries=retry_count, delay=retry_delay, timeout=timeout,
-                                verify_ssl=verify_ssl)
 
-        if not response:
-            results['fail'] += 1
-            test_case_result['passed'] = False
-            test_case_result['validation_results'].append({
-                'passed': False,
-                'message': "Request failed"
-            })
-            results['test_cases'].append(test_case_result)
-            continue
+def add_failure(test_case_result: Dict[str, Any], message: str) -> None:
+    print_warning(message)
+    test_case_result['passed'] = False
+    test_case_result['validation_results'].append({
+        'passed': False,
+        'message': message
+    })
 
-        executed_tests += 1
-        status_code = response.status_code
-        response_time = response.elapsed.total_seconds()
-        content_length = response.headers.get('Content-Length', 'Unknown')
 
-        test_case_result['status_code'] = status_code
-        test_case_result['expected_status'] = expected_status
-        test_case_result['response_time'] = format_time(response_time)
-        test_case_result['content_length'] = format_size(
-            int(content_length)) if content_length.isdigit() else content_length
+def check_snapshot(case: Dict[str, Any], response_json: Any, test_case_result: Dict[str, Any]) -> None:
+    snapshots = get_snapshots()
+    if snapshots is None or not case.get('snapshot', True):
+        return
+    try:
+        with profile_stage('snapshot'):
+            verdict, differences = snapshots.check(case, response_json)
+    except ValueError as e:
+        add_failure(test_case_result, f"Snapshot Failed: {e}")
+        return
+    shown = differences[:MAX_FAILING_PATHS]
+    if len(differences) > MAX_FAILING_PATHS:
+        shown.append(f"... and {len(differences) - MAX_FAILING_PATHS} more")
 
-        if expected_status and status_code != expected_status:
-            print_warning(f"Status Code Mismatch: Expected {expected_status}, but got {status_code}")
-            results['fail'] += 1
-            test_case_result['passed'] = False
-            test_case_result['validation_results'].append({
-                'passed': False,
-                'message': f"Status Code Mismatch: Expected {expected_status}, but got {status_code}"
-            })
-            results['test_cases'].append(test_case_result)
-            continue
+    if verdict == 'changed':
+        add_failure(test_case_result, f"Snapshot Mismatch: {'; '.join(shown)}")
+    elif verdict == 'updated':
+        print_info("Snapshot", f"Updated, {len(differences)} difference(s): {'; '.join(shown)}")
+    else:
+        print_info("Snapshot", verdict.capitalize())
 
-        print_info("Status Code", f"{status_code}" + (f" (Expected: {expected_status})" if expected_status else ""))
-        print_info("Response Time", format_time(response_time))
-        results['total_time'] += response_time
 
-        if response_time > time_threshold:
-            print_warning(f"Response time exceeds threshold of {time_threshold} seconds")
-            test_case_result['validation_results'].append({
-                'passed': True,
-                'warning': True,
-                'message': f"Response time exceeds threshold of {time_threshold} seconds"
-            })
+def record_timings(test_case_result: Dict[str, Any], timings: List[Dict[str, Any]], results: Dict[str, Any]) -> None:
+    if not timings:
+        return
+    for timing in timings:
+        if 'retry_in' in timing:
+            print_warning(f"Attempt {timing['attempt']} failed: {timing.get('error')}. "
+                          f"Retrying in {format_time(timing['retry_in'])}")
+    test_case_result['timings'] = timings
+    test_case_result['timing'] = format_timing(timings[-1])
+    print_info("Timing", test_case_result['timing'] + (f" ({len(timings)} attempts)" if len(timings) > 1 else ""))
+
+    # Waiting for the rate limiter is not part of the response time
+    throttled = sum(timing.get('throttled', 0) for timing in timings)
+    if throttled:
+        test_case_result['throttled'] = format_time(throttled)
+        test_case_result['throttled_seconds'] = throttled
+        results['throttled_time'] += throttled
+        print_info("Rate Limit Wait", test_case_result['throttled'])
+
+
+def check_large_json(case: Dict[str, Any], response: requests.Response, test_case_result: Dict[str, Any]) -> None:
+    # The body is over the size cap and sits in a temporary file, so a top-level array is checked one element at a
+    # time and the checks that need the whole document are skipped
+    expected_schema = case.get('expected_schema')
+    expected_response = case.get('expected_response', {})
+    print_info("Response Body", f"{format_size(response.body_bytes)}, over the body size cap; checked while streaming")
+
+    with profile_stage('validate_headers'):
+        headers_valid, headers_message = validate_headers(response.headers, case.get('expected_headers', {}),
+                                                          case.get('forbidden_headers', []))
+    if not headers_valid:
+        add_failure(test_case_result, f"Header Validation Failed: {headers_message}")
+    else:
+        print_info("Header Validation", "Passed")
+
+    is_array = body_preview(response).lstrip().startswith('[')
+    skipped = [field for field in ('expected_content', 'expected_types', 'assertions') if case.get(field)]
+    if get_snapshots() is not None and case.get('snapshot', True):
+        skipped.append('snapshot')
+    if not is_array:
+        skipped += [field for field in ('expected_schema', 'expected_response') if case.get(field)]
+    if skipped:
+        message = f"Response body is too large to check {', '.join(skipped)}"
+        print_warning(message)
+        test_case_result['validation_results'].append({
+            'passed': True,
+            'warning': True,
+            'message': message
+        })
+    if not is_array:
+        return
 
-        formatted_length = format_size(int(content_length)) if content_length.isdigit() else content_length
-        print_info("Content Length", formatted_length)
+    try:
+        with profile_stage('validate_schema'):
+            missing_keys, extra_keys, failing_paths, count = compile_schema(
+                expected_schema or {}).validate_elements(iter_json_array_body(response))
+    except json.JSONDecodeError as e:
+        add_failure(test_case_result, f"Response body is not JSON: {e}")
+        return
 
-        if content_length.isdigit():
-            results['total_length'] += int(content_length)
-            results['length_count'] += 1
+    if missing_keys or extra_keys:
+        shown_paths = failing_paths[:MAX_FAILING_PATHS]
+        if len(failing_paths) > MAX_FAILING_PATHS:
+            shown_paths.append(f"... and {len(failing_paths) - MAX_FAILING_PATHS} more")
+        add_failure(test_case_result, f"Schema Validation Failed. Missing keys: {missing_keys}, "
+                                      f"Extra keys: {extra_keys}. Failing paths: {'; '.join(shown_paths)}")
+    elif expected_schema:
+        print_info("Schema Validation", "Passed")
+
+    if 'length' in expected_response:
+        min_length = expected_response['length'].get('min', 0)
+        if count < min_length:
+            add_failure(test_case_result, f"Response length is less than the minimum expected {min_length}")
+
+
+def check_response(index: int, case: Dict[str, Any], response: Union[requests.Response, RequestFailure, None],
+                   show_response: bool,
+                   results: Dict[str, Any], time_threshold: float = 2) -> Dict[str, Any]:
+    method = case['method']
+    url = case['url']
+    expected_status = case.get('expected_status')
+    expected_schema = case.get('expected_schema')
+    expected_headers = case.get('expected_headers', {})
+    forbidden_headers = case.get('forbidden_headers', [])
+    expected_response = case.get('expected_response', {})
+    expected_content = case.get('expected_content', {})
+    expected_types = case.get('expected_types', {})
+    assertions = case.get('assertions', {})
+
+    print_header(f"Test Case {index}: {method} {url}")
+
+    test_case_result = {
+        'id': index,
+        'description': case.get('description', f"Test Case {index}"),
+        'method': method,
+        'url': url,
+        'passed': True,
+        'validation_results': []
+    }
 
-        content_type = response.headers.get('Content-Type', '')
-        if 'application/json' in content_type:
-            try:
-                response_json = response.json()
-                schema_valid = True
-
-                if expected_schema:
-                    missing_keys, extra_keys = validate_schema(response_json, expected_schema)
-                    if missing_keys or extra_keys:
-                        schema_valid = False
-                        print_warning("Schema Validation Failed")
-                        if missing_keys:
-                            print_warning(f"Missing keys: {missing_keys}")
-                        if extra_keys:
-                            print_warning(f"Extra keys: {extra_keys}")
-                        test_case_result['validation_results'].append({
-                            'passed': False,
-                            'message': f"Schema Validation Failed. Missing keys: {missing_keys}, Extra keys: {extra_keys}"
-                        })
-                    else:
-                        print_info("Schema Validation", "Passed")
-
-                headers_valid, headers_message = validate_headers(response.headers, expected_headers, forbidden_headers)
-                if not headers_valid:
-                    print_warning(f"Header Validation Failed: {headers_message}")
+    if isinstance(response, RequestFailure):
+        # The attempts of a failed request are reported like those of a response, retries included
+        record_timings(test_case_result, response.timings, results)
+        add_failure(test_case_result, f"Request failed: {response.error}")
+        return test_case_result
+    if response is None:
+        test_case_result['passed'] = False
+        test_case_result['validation_results'].append({
+            'passed': False,
+            'message': "Request failed"
+        })
+        return test_case_result
+
+    results['executed'] += 1
+    status_code = response.status_code
+    response_time = response.elapsed.total_seconds()
+    content_length = format_size(response.wire_bytes)
+    if response.body_bytes != response.wire_bytes:
+        content_length += f" ({format_size(response.body_bytes)} decoded)"
+
+    test_case_result['status_code'] = status_code
+    test_case_result['expected_status'] = expected_status
+    test_case_result['response_time'] = format_time(response_time)
+    test_case_result['response_seconds'] = response_time
+    test_case_result['content_length'] = content_length
+    timings = getattr(response, 'timings', [])
+
+    if expected_status and status_code != expected_status:
+        record_timings(test_case_result, timings, results)
+        print_warning(f"Status Code Mismatch: Expected {expected_status}, but got {status_code}")
+        test_case_result['passed'] = False
+        test_case_result['validation_results'].append({
+            'passed': False,
+            'message': f"Status Code Mismatch: Expected {expected_status}, but got {status_code}"
+        })
+        return test_case_result
+
+    print_info("Status Code", f"{status_code}" + (f" (Expected: {expected_status})" if expected_status else ""))
+    print_info("Response Time", format_time(response_time))
+
+    record_timings(test_case_result, timings, results)
+    if timings:
+        for message in check_timing_budget(timings[-1], case.get('timing_budget', {})):
+            print_warning(f"Timing Budget Exceeded: {message}")
+            test_case_result['passed'] = False
+            test_case_result['validation_results'].append({
+                'passed': False,
+                'message': f"Timing Budget Exceeded: {message}"
+            })
+
+    results['total_time'] += response_time
+
+    # Against a baseline with enough history, the regression check replaces the fixed threshold
+    history = get_history()
+    baseline = history.record(case, response_time) if history is not None else None
+    if baseline is not None:
+        results['compared'] += 1
+        test_case_result['baseline'] = baseline['message']
+        if baseline['verdict'] == 'regression':
+            results['regressions'] += 1
+            add_failure(test_case_result, f"Performance Regression: {baseline['message']}")
+        else:
+            print_info("Baseline", baseline['message'])
+    elif response_time > time_threshold:
+        print_warning(f"Response time exceeds threshold of {time_threshold} seconds")
+        test_case_result['validation_results'].append({
+            'passed': True,
+            'warning': True,
+            'message': f"Response time exceeds threshold of {time_threshold} seconds"
+        })
+
+    print_info("Content Length", content_length)
+    results['total_length'] += response.wire_bytes
+    results['length_count'] += 1
+
+    content_type = response.headers.get('Content-Type', '')
+    if 'application/json' in content_type and is_spilled(response):
+        check_large_json(case, response, test_case_result)
+    elif 'application/json' in content_type:
+        try:
+            with profile_stage('json_decode'):
+                response_json = json_body(response)
+            schema_valid = True
+
+            if expected_schema:
+                with profile_stage('validate_schema'):
+                    missing_keys, extra_keys, failing_paths = compile_schema(expected_schema).validate(response_json)
+                if missing_keys or extra_keys:
                     schema_valid = False
+                    print_warning("Schema Validation Failed")
+                    if missing_keys:
+                        print_warning(f"Missing keys: {missing_keys}")
+                    if extra_keys:
+                        print_warning(f"Extra keys: {extra_keys}")
+                    shown_paths = failing_paths[:MAX_FAILING_PATHS]
+                    if len(failing_paths) > MAX_FAILING_PATHS:
+                        shown_paths.append(f"... and {len(failing_paths) - MAX_FAILING_PATHS} more")
+                    print_warning(f"Failing paths: {'; '.join(shown_paths)}")
                     test_case_result['validation_results'].append({
                         'passed': False,
-                        'message': f"Header Validation Failed: {headers_message}"
+                        'message': f"Schema Validation Failed. Missing keys: {missing_keys}, Extra keys: {extra_keys}. "
+                                   f"Failing paths: {'; '.join(shown_paths)}"
                     })
                 else:
-                    print_info("Header Validation", "Passed")
+                    print_info("Schema Validation", "Passed")
+
+            with profile_stage('validate_headers'):
+                headers_valid, headers_message = validate_headers(response.headers, expected_headers,
+                                                                  forbidden_headers)
+            if not headers_valid:
+                print_warning(f"Header Validation Failed: {headers_message}")
+                schema_valid = False
+                test_case_result['validation_results'].append({
+                    'passed': False,
+                    'message': f"Header Validation Failed: {headers_message}"
+                })
+            else:
+                print_info("Header Validation", "Passed")
 
-                if expected_content:
+            if expected_content:
+                with profile_stage('validate_content'):
                     content_valid, content_message = validate_content(response_json, expected_content)
-                    if not content_valid:
-                        print_warning(f"Content Validation Failed: {content_message}")
-                        schema_valid = False
-                        test_case_result['validation_results'].append({
-                            'passed': False,
-                            'message': f"Content Validation Failed: {content_message}"
-                        })
-                    else:
-                        print_info("Content Validation", "Passed")
-
-                if expected_types:
+                if not content_valid:
+                    print_warning(f"Content Validation Failed: {content_message}")
+                    schema_valid = False
+                    test_case_result['validation_results'].append({
+                        'passed': False,
+                        'message': f"Content Validation Failed: {content_message}"
+                    })
+                else:
+                    print_info("Content Validation", "Passed")
+
+            if expected_types:
+                with profile_stage('validate_content_type'):
                     types_valid, types_message = validate_content_type(response_json, expected_types)
-                    if not types_valid:
-                        print_warning(f"Content Type Validation Failed: {types_message}")
-                        schema_valid = False
-                        test_case_result['validation_results'].append({
-                            'passed': False,
-                            'message': f"Content Type Validation Failed: {types_message}"
-                        })
-                    else:
-                        print_info("Content Type Validation", "Passed")
-
-                if 'length' in expected_response:
-                    min_length = expected_response['length'].get('min', 0)
-                    if not (isinstance(response_json, list) and len(response_json) >= min_length):
-                        print_warning(f"Response length is less than the minimum expected {min_length}")
-                        schema_valid = False
-                        test_case_result['validation_results'].append({
-                            'passed': False,
-                            'message': f"Response length is less than the minimum expected {min_length}"
-                        })
-
-                if show_response:
-                    print_info("Response Body", json.dumps(response_json, indent=2))
-
-                if schema_valid:
-                    results['pass'] += 1
+                if not types_valid:
+                    print_warning(f"Content Type Validation Failed: {types_message}")
+                    schema_valid = False
+                    test_case_result['validation_results'].append({
+                        'passed': False,
+                        'message': f"Content Type Validation Failed: {types_message}"
+                    })
+                else:
+                    print_info("Content Type Validation", "Passed")
+
+            if assertions:
+                with profile_stage('validate_assertions'):
+                    try:
+                        failures = compile_assertions(assertions).validate(response_json)
+                    except InvalidAssertion as e:
+                        failures = [f"Invalid assertions: {e}"]
+                if failures:
+                    shown_failures = failures[:MAX_FAILING_PATHS]
+                    if len(failures) > MAX_FAILING_PATHS:
+                        shown_failures.append(f"... and {len(failures) - MAX_FAILING_PATHS} more")
+                    print_warning(f"Assertions Failed: {'; '.join(shown_failures)}")
+                    schema_valid = False
+                    test_case_result['validation_results'].append({
+                        'passed': False,
+                        'message': f"Assertions Failed: {'; '.join(shown_failures)}"
+                    })
                 else:
-                    results['fail'] += 1
-                    test_case_result['passed'] = False
+                    print_info("Assertions", "Passed")
+
+            if 'length' in expected_response:
+                min_length = expected_response['length'].get('min', 0)
+                if not (isinstance(response_json, list) and len(response_json) >= min_length):
+                    print_warning(f"Response length is less than the minimum expected {min_length}")
+                    schema_valid = False
+                    test_case_result['validation_results'].append({
+                        'passed': False,
+                        'message': f"Response length is less than the minimum expected {min_length}"
+                    })
+
+            check_snapshot(case, response_json, test_case_result)
+
+            if show_response:
+                print_info("Response Body", json_dumps_pretty(response_json))
 
-            except json.JSONDecodeError:
-                print_error(f"Response body is not JSON => {response.text}")
-                results['fail'] += 1
+            if not schema_valid:
                 test_case_result['passed'] = False
-                test_case_result['validation_results'].append({
-                    'passed': False,
-                    'message': "Response body is not JSON"
-                })
-        elif 'text/html' in content_type:
-            print_info("Response Body", f"HTML content: {response.text[:100]}...")
-            results['pass'] += 1
-        else:
-            print_warning(f"Unexpected Content-Type: {content_type}")
-            results['fail'] += 1
+
+        except json.JSONDecodeError:
+            print_error(f"Response body is not JSON => {body_preview(response, 1000)}")
             test_case_result['passed'] = False
             test_case_result['validation_results'].append({
                 'passed': False,
-                'message': f"Unexpected Content-Type: {content_type}"
+                'message': "Response body is not JSON"
             })
-
-        if status_code == 200 and 'Set-Cookie' in response.headers:
-            cookies = response.headers['Set-Cookie']
-            print_info("Cookies", "Updated for subsequent requests")
-
-        results['test_cases'].append(test_case_result)
-
-    avg_time = results['total_time'] / executed_tests if executed_tests else 0
-    avg_length = results['total_length'] / results['length_count'] if results['length_count'] else 0
+    elif 'text/html' in content_type:
+        print_info("Response Body", f"HTML content: {body_preview(response)}...")
+    else:
+        print_warning(f"Unexpected Content-Type: {content_type}")
+        test_case_result['passed'] = False
+        test_case_result['validation_results'].append({
+            'passed': False,
+            'message': f"Unexpected Content-Type: {content_type}"
+        })
+
+    if status_code == 200 and 'Set-Cookie' in response.headers:
+        print_info("Cookies", "Updated for subsequent requests")
+
+    return test_case_result
+
+
+def reuse_result(index: int, case: Dict[str, Any], cached: CachedResult, results: Dict[str, Any]) -> Dict[str, Any]:
+    test_case_result = get_result_cache().cached_result(cached.case_hash)
+    test_case_result.update(id=index, cached=True)
+    start_case()
+    print_header(f"Test Case {index}: {case['method']} {case['url']}")
+    print_info("Result", f"{'Passed' if test_case_result['passed'] else 'Failed'} (reused from an earlier run)")
+    finish_case(test_case_result['passed'])
+    print_event('test_case', test_case_result)
+    results['cached'] += 1
+    results['pass' if test_case_result['passed'] else 'fail'] += 1
+    return test_case_result
+
+
+def process_response(index: int, case: Dict[str, Any], response: Union[requests.Response, RequestFailure, None],
+                     show_response: bool,
+                     results: Dict[str, Any], time_threshold: float = 2) -> Dict[str, Any]:
+    # In quiet mode the lines of a test case are only printed if it fails
+    start_case()
+    test_case_result = check_response(index, case, response, show_response, results, time_threshold)
+    finish_case(test_case_result['passed'])
+    print_event('test_case', test_case_result)
+    results['pass' if test_case_result['passed'] else 'fail'] += 1
+    return test_case_result
+
+
+def summarize_results(totals: Dict[str, Any], connection_stats: Dict[str, int]) -> Dict[str, Any]:
+    executed_tests = totals['executed']
+    avg_time = totals['total_time'] / executed_tests if executed_tests else 0
+    avg_length = totals['total_length'] / totals['length_count'] if totals['length_count'] else 0
 
     print_header("Test Summary")
-    print_info("Total Test Cases", total_tests)
+    print_info("Total Test Cases", totals['total_tests'])
     print_info("Executed Test Cases", executed_tests)
-    print_info("Passed", results['pass'])
-    print_info("Failed", results['fail'])
+    print_info("Passed", totals['pass'])
+    print_info("Failed", totals['fail'])
     print_info("Average Response Time", format_time(avg_time))
     print_info("Average Content Length", format_size(avg_length))
-
-    # Generate HTML report
+    connection_reuse = (f"{connection_stats['reused']} of {connection_stats['requests']} requests reused a "
+                        f"connection ({connection_stats['connections']} opened)")
+    print_info("Connection Reuse", connection_reuse)
+    if totals.get('cached'):
+        print_info("Reused Results", f"{totals['cached']} test cases were not sent again")
+    throttled = None
+    if totals.get('throttled_time'):
+        throttled = f"{format_time(totals['throttled_time'])} spent waiting for the rate limiter"
+        print_info("Rate Limit Wait", throttled)
+    baseline = None
+    if totals.get('compared'):
+        baseline = f"{totals['regressions']} regression(s) in {totals['compared']} test cases compared"
+        print_info("Performance Baseline", baseline)
+
+    # The raw totals let partial results of several shards be merged later
     report_results = {
-        'total_tests': total_tests,
+        'total_tests': totals['total_tests'],
         'executed_tests': executed_tests,
+        'pass': totals['pass'],
+        'fail': totals['fail'],
+        'avg_response_time': format_time(avg_time),
+        'avg_content_length': format_size(avg_length),
+        'connection_reuse': connection_reuse,
+        'baseline': baseline,
+        'cached': totals.get('cached', 0),
+        'throttled': throttled,
+        'totals': totals,
+        'connections': connection_stats
+    }
+    print_event('summary', report_results)
+    return report_results
+
+
+def run_test_cases(test_cases: Iterable[Dict[str, Any]], show_response: bool, verify_ssl: bool = True,
+                   concurrency: int = 1, reporters: Optional[List[Reporter]] = None,
+                   shard: Optional[Tuple[int, int]] = None, max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> None:
+    results = new_results()
+    total_tests = 0
+    reporters = reporters if reporters is not None else [HtmlReporter()]
+    numbered_cases = profile_iteration('load', select_shard(test_cases, *shard) if shard
+                                       else enumerate(test_cases, start=1))
+    cache = get_result_cache()
+
+    def execute(case: Dict[str, Any], cookies: Optional[str]) -> Tuple[Any, Optional[str]]:
+        if cache is not None and not case.get('skip', False) and case['method'] in VALID_METHODS:
+            digest = case_hash(case)
+            if not cache.should_run(digest):
+                return CachedResult(digest), cookies
+        return send_test_case(case, cookies, verify_ssl, max_body_size)
+
+    # Each result goes to the reporters as soon as it is known, so nothing accumulates and an aborted run still leaves
+    # a partial report behind
+    for reporter in reporters:
+        reporter.start()
+    try:
+        scheduler = CaseScheduler(execute, concurrency)
+        for index, case, response in scheduler.run(numbered_cases):
+            if case.get('skip', False):
+                start_case()
+                print_header(f"Test Case {index} is skipped.")
+                finish_case(True)
+                print_event('skipped', {'id': index})
+                continue
+
+            total_tests += 1
+            if case['method'] not in VALID_METHODS:
+                print_error(f"Invalid HTTP method: {case['method']}")
+                continue
+
+            if isinstance(response, CachedResult):
+                test_case_result = reuse_result(index, case, response, results)
+            else:
+                test_case_result = process_response(index, case, response, show_response, results)
+                if cache is not None:
+                    cache.store(case_hash(case), test_case_result,
+                                isinstance(response, requests.Response) and 'Set-Cookie' in response.headers)
+            for reporter in reporters:
+                reporter.add_test_case(test_case_result)
+    except BaseException:
+        for reporter in reporters:
+            reporter.abort()
+        close_history(save=False)
+        if cache is not None:
+            cache.flush()
+        raise
+
+    # Complete the reports with the summary
+    close_history()
+    if cache is not None:
+        cache.flush()
+    report_results = summarize_results(dict(results, total_tests=total_tests),
+                                       get_transport().connection_stats())
+    for reporter in reporters:
+        reporter.finish(report_results)
+
+
+def merge_results(partial_files: List[str], reporters: List[Reporter]) -> None:
+    try:
+        totals, connection_stats, test_cases = merge_partials(partial_files)
+    except (OSError, ValueError, KeyError) as e:
+        print_error(f"Cannot merge partial results: {e}")
+        return
+
+    write_reports(reporters, summarize_results(totals, connection_stats), test_cases)
+
+
+def run_workers(workers: int, argv: List[str], reporters: List[Reporter]) -> None:
+    # Every worker runs one shard of the suite with the same options and writes its results to a partial file
+    with tempfile.TemporaryDirectory(prefix='apisure-') as directory:
+        partial_files = [os.path.join(directory, f"shard-{shard}.ndjson") for shard in range(1, workers + 1)]
+        logs = [open(os.path.join(directory, f"shard-{shard}.log"), 'w+') for shard in range(1, workers + 1)]
+        processes = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv, '--shard', f"{shard}/{workers}",
+                              '--html', '', '--junit', '', '--metrics', '', '--profile-dump', '',
+                              '--ndjson', partial_file],
+                             stdout=log, stderr=subprocess.STDOUT)
+            for shard, (partial_file, log) in enumerate(zip(partial_files, logs), start=1)
+        ]
+
+        for shard, (process, log) in enumerate(zip(processes, logs), start=1):
+            process.wait()
+            log.seek(0)
+            print_header(f"Shard {shard}/{workers}")
+            print_raw(log.read())
+            log.close()
+            if process.returncode:
+                print_error(f"Shard {shard}/{workers} exited with code {process.returncode}")
+
+        merge_results(partial_files, reporters)
+
+
+def run_load_cases(test_cases: Iterable[Dict[str, Any]], show_response: bool, rps: float, duration: float,
+                   concurrency: int, verify_ssl: bool = True, sample_rate: float = 0.01,
+                   reporters: Optional[List[Reporter]] = None, max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> None:
+    load_cases = []
+    for index, case in enumerate(test_cases, start=1):
+        if case.get('skip', False):
+            continue
+        if case['method'] not in VALID_METHODS:
+            print_error(f"Invalid HTTP method: {case['method']}")
+            continue
+        load_cases.append((index, case))
+
+    if not load_cases:
+        print_error("No test cases to run under load")
+        return
+
+    print_header(f"Load Test: {rps:g} req/s for {duration:g} s across {len(load_cases)} test case(s)")
+    result = run_load_test(load_cases, rps, duration, concurrency, verify_ssl, sample_rate,
+                           max_body_size=max_body_size)
+    summary = load_summary(result)
+
+    # Validators run on a sample of the responses once the load has finished
+    results = new_results()
+    sampled_results = [process_response(index, case, response, show_response, results)
+                       for index, case, response in result['samples']]
+
+    print_header("Load Test Summary")
+    print_info("Target Rate", summary['target_rps'])
+    print_info("Throughput", summary['throughput'])
+    print_info("Duration", summary['duration'])
+    print_info("Requests", summary['requests'])
+    print_info("Errors", f"{summary['errors']} ({summary['error_rate']})")
+    print_info("Latency", ", ".join(f"{label} {value}" for label, value in summary['latency']))
+    print_info("Service Time", ", ".join(f"{label} {value}" for label, value in summary['service_time']))
+    for case_summary in summary['cases']:
+        print_info(f"Test Case {case_summary['id']}",
+                   f"{case_summary['requests']} requests, {case_summary['errors']} errors, "
+                   + ", ".join(f"{label} {value}" for label, value in case_summary['latency']))
+    print_info("Sampled Responses Passed", f"{results['pass']} of {len(result['samples'])}")
+
+    avg_length = results['total_length'] / results['length_count'] if results['length_count'] else 0
+    report_results = {
+        'total_tests': len(result['samples']),
+        'executed_tests': results['executed'],
         'pass': results['pass'],
         'fail': results['fail'],
-        'avg_response_time': format_time(avg_time),
+        'avg_response_time': format_time(result['service_time'].mean),
         'avg_content_length': format_size(avg_length),
-        'test_cases': results['test_cases']
+        'load': summary
     }
-    generate_html_report(report_results)
+    print_event('summary', report_results)
+    write_reports(reporters if reporters is not None else [HtmlReporter()], report_results, sampled_results)
+
+
+def read_test_cases(path: str, stream: bool) -> Optional[Iterable[Dict[str, Any]]]:
+    try:
+        with profile_stage('load'):
+            # Templates are expanded lazily, while the runner consumes the test cases
+            return expand_test_cases(load_test_cases(path, stream), os.path.dirname(os.path.abspath(path)))
+    except json.JSONDecodeError:
+        print_error(f"Failed to parse JSON from file: {path}")
+    except FileNotFoundError:
+        print_error(f"File not found: {path}")
+    return None
+
+
+def run_suite(args: argparse.Namespace, reporters: List[Reporter], shard: Optional[Tuple[int, int]],
+              concurrency: int) -> None:
+    test_cases = read_test_cases(args.test_cases_file, args.stream)
+    if test_cases is None:
+        return
+    # Replayed timings say nothing about how fast the endpoint normally is
+    if not args.replay:
+        try:
+            configure_history(args.history, args.run_label, args.baseline, args.baseline_window,
+                              args.regression_threshold / 100)
+        except sqlite3.Error as e:
+            print_error(f"Cannot open history database: {e}")
+            return
+    try:
+        run_test_cases(test_cases, args.response, not args.no_verify_ssl, concurrency, reporters, shard,
+                       args.max_body_size)
+    except json.JSONDecodeError as e:
+        print_error(f"Failed to parse JSON from file: {args.test_cases_file} ({e})")
+    except TemplateError as e:
+        print_error(f"Invalid test case template in {args.test_cases_file}: {e}")
+
+
+def watch_test_cases(path: str, run: Callable[[], None], interval: float = 0.5) -> None:
+    print_info("Watching", f"{path} for changes (Ctrl+C to stop)")
+    last_modified = os.stat(path).st_mtime_ns
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                modified = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                # Some editors replace the file when saving
+                continue
+            if modified != last_modified:
+                last_modified = modified
+                run()
+                print_info("Watching", f"{path} for changes (Ctrl+C to stop)")
+    except KeyboardInterrupt:
+        print_info("Watching", "stopped")
+
+
+def print_profile(profiler: StageProfiler, wall: float, cpu: float) -> None:
+    rows = profiler.summary()
+    print_header("Profile")
+    print_info("Run", f"wall {format_time(wall)}, CPU {format_time(cpu)}")
+    for row in rows:
+        print_info(row['stage'], f"{row['calls']} calls, wall {format_time(row['wall'])}, "
+                                 f"CPU {format_time(row['cpu'])}, {format_time(row['wall'] / row['calls'])} per call")
+
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace, reporters: List[Reporter]) -> None:
+    if args.merge:
+        merge_results(args.merge, reporters)
+        return
+    if not args.test_cases_file:
+        parser.error("the test_cases_file argument is required unless --merge is given")
+
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        print_error(str(e))
+        return
+    if args.workers and args.workers > 1 and not shard:
+        if args.load or args.record or args.watch:
+            print_error("--workers cannot be combined with --load, --record or --watch")
+            return
+        run_workers(args.workers, sys.argv[1:], reporters)
+        return
+
+    concurrency = args.concurrency or (64 if args.load else 1)
+    if concurrency < 1:
+        print_error("Concurrency must be at least 1")
+        return
+    if args.load and (args.rps <= 0 or args.duration <= 0):
+        print_error("Load mode needs a positive --rps and --duration")
+        return
+    if args.load and (args.changed_only or args.failed_only or args.watch):
+        print_error("--changed-only, --failed-only and --watch cannot be combined with --load")
+        return
+
+    pool_size = args.pool_size or max(10, concurrency)
+    configure_sessions(pool_size, not args.no_keep_alive)
+    try:
+        configure_transport(args.http2 or args.http2_prior_knowledge, pool_size, not args.no_keep_alive,
+                            args.http2_prior_knowledge)
+    except ValueError as e:
+        print_error(str(e))
+        return
+    configure_circuit_breaker(args.breaker_threshold, args.breaker_cooldown)
+    try:
+        configure_rate_limiter(dict(parse_limit(value) for value in args.rate_limit),
+                               dict(parse_limit(value, integer=True) for value in args.max_in_flight))
+    except ValueError as e:
+        print_error(str(e))
+        return
+    try:
+        configure_cassette(args.record or args.replay, 'record' if args.record else 'replay' if args.replay else None)
+    except OSError as e:
+        print_error(f"Cannot open cassette: {e}")
+        return
+
+    if args.load:
+        test_cases = read_test_cases(args.test_cases_file, args.stream)
+        if test_cases is None:
+            return
+        try:
+            run_load_cases(test_cases, args.response, args.rps, args.duration, concurrency, not args.no_verify_ssl,
+                           args.load_sample, reporters, args.max_body_size)
+        except json.JSONDecodeError as e:
+            print_error(f"Failed to parse JSON from file: {args.test_cases_file} ({e})")
+        except TemplateError as e:
+            print_error(f"Invalid test case template in {args.test_cases_file}: {e}")
+        return
+
+    if (args.changed_only or args.failed_only or args.watch) and not args.cache:
+        print_error("--changed-only, --failed-only and --watch need the result cache (--cache)")
+        return
+    try:
+        configure_result_cache(args.cache, args.changed_only or args.watch, args.failed_only)
+    except sqlite3.Error as e:
+        print_error(f"Cannot open result cache: {e}")
+        return
+
+    try:
+        configure_snapshots(args.snapshot_dir if args.snapshot or args.update_snapshots else None,
+                            args.update_snapshots, args.snapshot_ignore)
+    except (OSError, ValueError) as e:
+        print_error(f"Cannot use snapshots: {e}")
+        return
+
+    run_suite(args, reporters, shard, concurrency)
+    if args.watch:
+        watch_test_cases(args.test_cases_file, lambda: run_suite(args, reporters, shard, concurrency))
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Run API tests based on a JSON file.')
-    parser.add_argument('test_cases_file', type=str, help='Path to the JSON file containing test cases.')
+    parser.add_argument('test_cases_file', type=str, nargs='?', help='Path to the JSON file containing test cases.')
     parser.add_argument('-R', '--response', action='store_true',
                         help='Print the response body even if the structure matches.')
     parser.add_argument('--no-verify-ssl', action='store_true', help='Disable SSL certificate verification')
+    parser.add_argument('-c', '--concurrency', type=int,
+                        help='Number of test cases to run in parallel. Cases that rely on cookies from an earlier '
+                             'case must list it in "depends_on" (default: 1, sequential; 64 in load mode).')
+    parser.add_argument('--pool-size', type=int,
+                        help='Maximum number of pooled connections kept per host (default: 10 or the concurrency).')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='Close the connection after every request instead of reusing it.')
+    parser.add_argument('--http2', action='store_true',
+                        help='Send requests over HTTP/2 where the server offers it (needs httpx[http2]).')
+    parser.add_argument('--http2-prior-knowledge', action='store_true',
+                        help='Like --http2, but also speak HTTP/2 without TLS (h2c) to plain http:// URLs.')
+    parser.add_argument('--load', action='store_true',
+                        help='Run the test cases as a weighted load mix at a fixed request rate.')
+    parser.add_argument('--rps', type=float, default=10, help='Target requests per second in load mode (default: 10).')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Duration of the load test in seconds (default: 10).')
+    parser.add_argument('--load-sample', type=float, default=0.01,
+                        help='Fraction of load test responses that go through the validators (default: 0.01).')
+    parser.add_argument('--json-library', choices=['auto', *JSON_LIBRARIES], default='auto',
+                        help='JSON library used to decode test cases and responses; auto picks orjson or msgspec '
+                             'when installed, then the standard library (default: auto).')
+    parser.add_argument('--max-body-size', type=int, default=DEFAULT_MAX_BODY_SIZE,
+                        help='Largest decoded response body, in bytes, kept in memory. Larger bodies are written to a '
+                             'temporary file and JSON arrays in them are validated one element at a time '
+                             f'(default: {DEFAULT_MAX_BODY_SIZE}).')
+    parser.add_argument('--breaker-threshold', type=int, default=5,
+                        help='Consecutive connection errors, timeouts or 5xx responses after which requests to a host '
+                             'fail immediately (default: 5, 0 disables the circuit breaker).')
+    parser.add_argument('--breaker-cooldown', type=float, default=30,
+                        help='Seconds before a host with an open circuit gets a trial request (default: 30).')
+    parser.add_argument('--rate-limit', action='append', default=[], metavar='[HOST=]RPS',
+                        help='Send at most RPS requests per second to each host, to HOST, or to the test cases tagged '
+                             'NAME with tag:NAME=RPS. Can be given several times.')
+    parser.add_argument('--max-in-flight', action='append', default=[], metavar='[HOST=]N',
+                        help='Keep at most N requests in flight to each host, to HOST, or for the test cases tagged '
+                             'NAME with tag:NAME=N. Can be given several times.')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_FILE,
+                        help=f'SQLite file that keeps the latest result of every test case definition '
+                             f'(default: {DEFAULT_CACHE_FILE}, empty to disable).')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='Only send test cases that are new or changed since their cached result; reuse the '
+                             'cached results of the rest.')
+    parser.add_argument('--failed-only', action='store_true',
+                        help='Only send test cases whose cached result failed (and new or changed ones).')
+    parser.add_argument('--watch', action='store_true',
+                        help='After the run, re-run the changed test cases every time the test cases file is saved.')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Compare every JSON response with its snapshot, recording the snapshots that are missing.')
+    parser.add_argument('--update-snapshots', action='store_true',
+                        help='Like --snapshot, but replace the snapshots of responses that changed.')
+    parser.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR,
+                        help=f'Directory of the snapshots (default: {DEFAULT_SNAPSHOT_DIR}).')
+    parser.add_argument('--snapshot-ignore', action='append', default=[], metavar='PATH',
+                        help='Leave out a volatile field, such as $.meta.request_id or $.items[*].updated_at, from '
+                             'every snapshot. Can be given several times.')
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE,
+                        help=f'SQLite file that keeps the response time of every test case across runs '
+                             f'(default: {DEFAULT_HISTORY_FILE}, empty to disable).')
+    parser.add_argument('--run-label', help='Label stored with this run in the history, for example a branch name.')
+    parser.add_argument('--baseline', nargs='?', const='', metavar='LABEL',
+                        help='Fail test cases that are significantly slower than in previous runs, optionally only '
+                             'runs stored with this --run-label. Replaces the fixed 2 second response time warning.')
+    parser.add_argument('--baseline-window', type=int, default=20,
+                        help='Number of previous runs per test case the baseline is built from (default: 20).')
+    parser.add_argument('--regression-threshold', type=float, default=20,
+                        help='Slowdown against the baseline median, in percent, that counts as a regression when it '
+                             'is also statistically significant (default: 20).')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='CASSETTE',
+                          help='Store every response in a cassette file for later --replay runs.')
+    cassette.add_argument('--replay', metavar='CASSETTE',
+                          help='Serve responses from a cassette file recorded with --record instead of the network.')
+    parser.add_argument('--html', default='report.html', help='Path of the HTML report (default: report.html).')
+    parser.add_argument('--junit', help='Also write a JUnit XML report to this path.')
+    parser.add_argument('--ndjson', help='Also write one JSON object per test case to this path.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read test cases one at a time instead of loading the whole file. JSON Lines files '
+                             '(.jsonl, .ndjson) are always streamed.')
+    parser.add_argument('--shard', metavar='i/N',
+                        help='Only run the i-th of N stable slices of the test cases. Combine with --ndjson to write '
+                             'a partial result file for --merge.')
+    parser.add_argument('--workers', type=int,
+                        help='Split the test cases across this many processes and merge their results.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the wall and CPU time spent in each stage: loading, requests, JSON decoding, each '
+                             'validator, terminal output and reports.')
+    parser.add_argument('--profile-dump', metavar='PATH',
+                        help='Also run cProfile on the main thread and write its statistics to this file '
+                             '(open them with python -m pstats).')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Write an OpenMetrics file with per-endpoint response time histograms, retry counts and '
+                             'pass/fail counts, for example for the node_exporter textfile collector.')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Only print failing test cases, errors and the summary.')
+    parser.add_argument('--output-format', choices=[mode for mode in OUTPUT_MODES if mode != 'quiet'], default='text',
+                        help='Terminal output: text, or ndjson for one JSON event per line (test_case, skipped, '
+                             'summary, log) (default: text).')
+    parser.add_argument('--color', choices=['auto', 'always', 'never'], default='auto',
+                        help='Color the terminal output; auto colors it only on a terminal and without NO_COLOR '
+                             '(default: auto).')
+    parser.add_argument('--merge', nargs='+', metavar='PARTIAL',
+                        help='Build the summary and reports from the --ndjson files of finished shards.')
     args = parser.parse_args()
 
-    try:
-        with open(args.test_cases_file, 'r') as file:
-            test_cases = json.load(file)
-    except json.JSONDecodeError:
-        print_error(f"Failed to parse JSON from file: {args.test_cases_file}")
-        return
-    except FileNotFoundError:
-        print_error(f"File not found: {args.test_cases_file}")
-        return
+    configure_output('quiet' if args.quiet and args.output_format == 'text' else args.output_format,
+                     {'always': True, 'never': False}.get(args.color))
 
-    run_test_cases(test_cases, args.response, not args.no_verify_ssl)
+    configure_json(args.json_library)
+
+    reporters: List[Reporter] = [HtmlReporter(args.html)] if args.html else []
+    if args.junit:
+        reporters.append(JUnitReporter(args.junit))
+    if args.ndjson:
+        reporters.append(NdjsonReporter(args.ndjson))
+
+    if args.metrics:
+        reporters.append(MetricsReporter(args.metrics))
+
+    configure_profiler(args.profile or bool(args.profile_dump))
+    profile = cProfile.Profile() if args.profile_dump else None
+    if profile is not None:
+        profile.enable()
+    started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        run_command(parser, args, reporters)
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(args.profile_dump)
+        profiler = get_profiler()
+        if profiler is not None:
+            print_profile(profiler, time.perf_counter() - started, time.process_time() - cpu_started)
+            if profile is not None:
+                print_info("cProfile Statistics", args.profile_dump)
+        flush_output()
 
 
 if __name__ == "__main__":
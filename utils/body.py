@@ -0,0 +1,95 @@
+import codecs
+import io
+import tempfile
+from typing import Any, Iterable, Iterator
+
+import requests
+
+from utils.codec import json_loads
+from utils.loader import iter_json_array
+
+DEFAULT_MAX_BODY_SIZE = 64 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def read_body(response: requests.Response, max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> None:
+    """
+    Download the body of a response opened with ``stream=True``, counting wire and decoded bytes.
+
+    Bodies up to ``max_body_size`` decoded bytes end up in ``response.content`` as usual. Larger bodies are spilled to
+    a temporary file in ``response.body_file`` instead, so they never have to fit in memory; ``response.content`` is
+    not available for them.
+    """
+    store_body(response, response.raw.stream(CHUNK_SIZE, decode_content=True), max_body_size)
+    response.wire_bytes = response.raw.tell()
+
+
+def store_body(response: requests.Response, chunks: Iterable[bytes],
+               max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> None:
+    buffer = bytearray()
+    spill = None
+    decoded_bytes = 0
+
+    for chunk in chunks:
+        decoded_bytes += len(chunk)
+        if spill is None and decoded_bytes > max_body_size:
+            spill = tempfile.TemporaryFile()
+            spill.write(buffer)
+            buffer = bytearray()
+        if spill is None:
+            buffer += chunk
+        else:
+            spill.write(chunk)
+
+    response.body_bytes = decoded_bytes
+    response._content_consumed = True
+    if spill is None:
+        response._content = bytes(buffer)
+        response.body_file = None
+    else:
+        spill.seek(0)
+        response.body_file = spill
+
+
+def is_spilled(response: requests.Response) -> bool:
+    return getattr(response, 'body_file', None) is not None
+
+
+def iter_body(response: requests.Response) -> Iterator[bytes]:
+    if not is_spilled(response):
+        yield response.content
+        return
+    response.body_file.seek(0)
+    while True:
+        chunk = response.body_file.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def body_preview(response: requests.Response, size: int = 100) -> str:
+    if not is_spilled(response):
+        return response.text[:size]
+    response.body_file.seek(0)
+    return response.body_file.read(size * 4).decode(response.encoding or 'utf-8', errors='replace')[:size]
+
+
+def json_body(response: requests.Response) -> Any:
+    # UTF-8 bodies (the JSON default) go to the JSON library as bytes; requests handles any other declared charset
+    encoding = response.encoding
+    try:
+        utf8 = encoding is None or codecs.lookup(encoding).name == 'utf-8'
+    except LookupError:
+        utf8 = False
+    return json_loads(response.content) if utf8 else response.json()
+
+
+def iter_json_array_body(response: requests.Response) -> Iterator[Any]:
+    # Decodes one element at a time from the spilled file, so only the element being checked is held in memory
+    response.body_file.seek(0)
+    text = io.TextIOWrapper(response.body_file, encoding=response.encoding or 'utf-8')
+    try:
+        yield from iter_json_array(text.read)
+    finally:
+        # Keep the underlying file open for later readers
+        text.detach()
@@ -0,0 +1,173 @@
+import hashlib
+import itertools
+import json
+import os
+import struct
+import threading
+import zlib
+from datetime import timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils.body import CHUNK_SIZE, DEFAULT_MAX_BODY_SIZE, iter_body, store_body
+
+# Every record is: 64-byte hex request key, 4-byte occurrence, 4-byte payload length, then the zlib-compressed payload
+# (4-byte metadata length, JSON metadata, body). Opening a cassette only reads the record headers to build the index.
+RECORD_HEADER = struct.Struct('>64sII')
+METADATA_LENGTH = struct.Struct('>I')
+
+
+def _decompress(payload: bytes) -> Iterator[bytes]:
+    # Bounded output per step, so a highly compressed body is never inflated in one piece
+    decompressor = zlib.decompressobj()
+    pending = payload
+    while pending:
+        chunk = decompressor.decompress(pending, CHUNK_SIZE)
+        pending = decompressor.unconsumed_tail
+        if chunk:
+            yield chunk
+    yield decompressor.flush()
+
+
+def request_key(method: str, url: str, params: Any = None, json_body: Any = None, data: Any = None) -> str:
+    if json_body is not None:
+        body = json.dumps(json_body, sort_keys=True, separators=(',', ':')).encode()
+    elif isinstance(data, str):
+        body = data.encode()
+    elif isinstance(data, bytes):
+        body = data
+    else:
+        body = json.dumps(data, sort_keys=True, default=str).encode() if data is not None else b''
+
+    parts = [
+        method.upper(),
+        url,
+        json.dumps(params, sort_keys=True, default=str) if params is not None else '',
+        hashlib.sha256(body).hexdigest(),
+    ]
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded responses, keyed by method, URL, query parameters and a hash of the body.
+
+    The same request sent several times in a suite is recorded once per occurrence, so a replay serves them back in
+    the same order. Replays fall back to the last recorded occurrence when a request is sent more often than it was
+    recorded.
+    """
+
+    def __init__(self, path: str, mode: str) -> None:
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._index: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        self._latest: Dict[str, int] = {}
+        self._occurrences: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if mode == 'replay':
+            self._load_index()
+        self._file = open(path, 'rb' if mode == 'replay' else 'wb')
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def _load_index(self) -> None:
+        with open(self.path, 'rb') as file:
+            while True:
+                header = file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                key, occurrence, length = RECORD_HEADER.unpack(header)
+                self._add_to_index(key.decode(), occurrence, file.tell(), length)
+                file.seek(length, os.SEEK_CUR)
+
+    def _add_to_index(self, key: str, occurrence: int, offset: int, length: int) -> None:
+        self._index[(key, occurrence)] = (offset, length)
+        self._latest[key] = max(self._latest.get(key, 0), occurrence)
+
+    def next_occurrence(self, key: str) -> int:
+        with self._lock:
+            occurrence = self._occurrences.get(key, 0)
+            self._occurrences[key] = occurrence + 1
+            return occurrence
+
+    def record(self, key: str, occurrence: int, response: requests.Response) -> None:
+        metadata = json.dumps({
+            'status': response.status_code,
+            'reason': response.reason,
+            'url': response.url,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'elapsed': response.elapsed.total_seconds(),
+            'timings': getattr(response, 'timings', []),
+            'wire_bytes': getattr(response, 'wire_bytes', None),
+        }).encode()
+        compressor = zlib.compressobj()
+        parts = [compressor.compress(METADATA_LENGTH.pack(len(metadata)) + metadata)]
+        parts.extend(compressor.compress(chunk) for chunk in iter_body(response))
+        parts.append(compressor.flush())
+        payload = b''.join(parts)
+
+        with self._lock:
+            self._file.write(RECORD_HEADER.pack(key.encode(), occurrence, len(payload)))
+            offset = self._file.tell()
+            self._file.write(payload)
+            self._file.flush()
+            self._add_to_index(key, occurrence, offset, len(payload))
+
+    def replay(self, key: str, occurrence: int,
+               max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> Optional[requests.Response]:
+        location = self._index.get((key, occurrence))
+        if location is None and key in self._latest:
+            location = self._index[(key, self._latest[key])]
+        if location is None:
+            return None
+
+        offset, length = location
+        with self._lock:
+            self._file.seek(offset)
+            compressed = self._file.read(length)
+        chunks = _decompress(compressed)
+        head = b''
+        while len(head) < METADATA_LENGTH.size:
+            head += next(chunks)
+        metadata_length, = METADATA_LENGTH.unpack_from(head)
+        while len(head) < METADATA_LENGTH.size + metadata_length:
+            head += next(chunks)
+        metadata = json.loads(head[METADATA_LENGTH.size:METADATA_LENGTH.size + metadata_length])
+
+        response = requests.Response()
+        response.status_code = metadata['status']
+        response.reason = metadata['reason']
+        response.url = metadata['url']
+        response.headers = CaseInsensitiveDict(metadata['headers'])
+        response.encoding = metadata['encoding']
+        response.elapsed = timedelta(seconds=metadata['elapsed'])
+        response.timings = metadata['timings']
+        store_body(response, itertools.chain([head[METADATA_LENGTH.size + metadata_length:]], chunks), max_body_size)
+        response.wire_bytes = metadata.get('wire_bytes', response.body_bytes)
+        return response
+
+    def close(self) -> None:
+        self._file.close()
+
+
+_cassette: Optional[Cassette] = None
+
+
+def configure_cassette(path: Optional[str], mode: Optional[str]) -> Optional[Cassette]:
+    global _cassette
+    if _cassette is not None:
+        _cassette.close()
+    _cassette = Cassette(path, mode) if path and mode else None
+    return _cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    return _cassette
@@ -0,0 +1,126 @@
+import json
+from typing import Any, Callable, Dict, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+Decoder = Callable[[Union[bytes, str]], Any]
+PrettyEncoder = Callable[[Any], str]
+CanonicalEncoder = Callable[[Any], bytes]
+
+# Every digit maps to '0' and everything else to a space, so a run of digits is found with a single bytes.find
+_DIGITS = bytes(ord('0') if ord('0') <= byte <= ord('9') else ord(' ') for byte in range(256))
+# 19 digits is the shortest run that can be an integer beyond 64 bits, which orjson and msgspec decode as floats
+_LONG_NUMBER = b'0' * 19
+
+
+def _may_exceed_64_bits(data: bytes) -> bool:
+    # Also true for long digit runs inside strings, which only costs the slower exact decode
+    return data.translate(_DIGITS).find(_LONG_NUMBER) != -1
+
+
+def _stdlib_pretty(value: Any) -> str:
+    return json.dumps(value, indent=2)
+
+
+def _stdlib_canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _codecs() -> Dict[str, Tuple[Decoder, PrettyEncoder, CanonicalEncoder, Tuple[type, ...]]]:
+    # Decoder, indented encoder, compact sorted-key encoder and the errors on which the standard library has the final
+    # word, by library
+    codecs = {}
+    if orjson is not None:
+        codecs['orjson'] = (orjson.loads,
+                            lambda value: orjson.dumps(value, option=orjson.OPT_INDENT_2).decode(),
+                            lambda value: orjson.dumps(value, option=orjson.OPT_SORT_KEYS),
+                            (orjson.JSONDecodeError, orjson.JSONEncodeError))
+    if msgspec is not None:
+        codecs['msgspec'] = (msgspec.json.decode,
+                             lambda value: msgspec.json.format(msgspec.json.encode(value), indent=2).decode(),
+                             lambda value: msgspec.json.encode(value, order='sorted'),
+                             (msgspec.DecodeError, msgspec.EncodeError, TypeError))
+    codecs['json'] = (json.loads, _stdlib_pretty, _stdlib_canonical, ())
+    return codecs
+
+
+JSON_LIBRARIES = _codecs()
+
+
+class JsonCodec:
+    """
+    Decodes and pretty-prints JSON with the fastest library installed, orjson or msgspec, or the standard library.
+
+    The native libraries decode UTF-8 bytes directly, without building a ``str`` first. Documents they reject, such as
+    ``NaN`` or a byte order mark, are handed to the standard library, so they are accepted or rejected exactly as
+    before and errors are always :class:`json.JSONDecodeError`. The native libraries turn integers beyond 64 bits
+    into floats, so a document with a run of digits that long is decoded by the standard library as well.
+    """
+
+    def __init__(self, library: str = 'auto') -> None:
+        if library == 'auto':
+            library = next(iter(JSON_LIBRARIES))
+        if library not in JSON_LIBRARIES:
+            raise ValueError(f"JSON library '{library}' is not installed")
+        self.library = library
+        self._loads, self._dumps_pretty, self._dumps_canonical, self._fallback_errors = JSON_LIBRARIES[library]
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        if self._fallback_errors:
+            encoded = data.encode('utf-8', 'surrogatepass') if isinstance(data, str) else data
+            if not _may_exceed_64_bits(encoded):
+                try:
+                    return self._loads(data)
+                except self._fallback_errors:
+                    pass
+        return json.loads(data)
+
+    def dumps_pretty(self, value: Any) -> str:
+        if self._fallback_errors:
+            try:
+                return self._dumps_pretty(value)
+            except self._fallback_errors:
+                pass
+        return _stdlib_pretty(value)
+
+    def dumps_canonical(self, value: Any) -> bytes:
+        """Compact JSON with sorted keys, the same bytes for the same content with a given library."""
+        if self._fallback_errors:
+            try:
+                return self._dumps_canonical(value)
+            except self._fallback_errors:
+                pass
+        return _stdlib_canonical(value)
+
+
+_codec = JsonCodec()
+
+
+def configure_json(library: str = 'auto') -> JsonCodec:
+    global _codec
+    _codec = JsonCodec(library)
+    return _codec
+
+
+def get_json_codec() -> JsonCodec:
+    return _codec
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    return _codec.loads(data)
+
+
+def json_dumps_pretty(value: Any) -> str:
+    return _codec.dumps_pretty(value)
+
+
+def json_dumps_canonical(value: Any) -> bytes:
+    return _codec.dumps_canonical(value)
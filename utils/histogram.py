@@ -0,0 +1,90 @@
+import math
+from typing import Any, Dict, Iterable, Optional
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the spirit of HdrHistogram.
+
+    Values are recorded in microseconds into sparse buckets whose width grows with the magnitude of the value, so the
+    relative error stays below 1 / 2 ** (precision_bits - 1) (about 1.6% by default) whatever the range. Histograms with
+    the same precision can be merged losslessly.
+    """
+
+    def __init__(self, precision_bits: int = 7) -> None:
+        self.precision_bits = precision_bits
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _bucket(self, value: int) -> int:
+        shift = max(value.bit_length() - self.precision_bits, 0)
+        return (shift << self.precision_bits) | (value >> shift)
+
+    def _bucket_value(self, bucket: int) -> int:
+        shift = bucket >> self.precision_bits
+        mantissa = bucket & ((1 << self.precision_bits) - 1)
+        # Midpoint of the bucket, which halves the worst-case error compared to its lower bound
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def record(self, seconds: float, count: int = 1) -> None:
+        value = max(int(seconds * 1_000_000), 0)
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                value = min(max(self._bucket_value(bucket), self.min), self.max)
+                return value / 1_000_000
+        return self.max / 1_000_000
+
+    def percentiles(self, percentiles: Iterable[float] = (50, 90, 99, 99.9)) -> Dict[float, float]:
+        return {percentile: self.percentile(percentile) for percentile in percentiles}
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'precision_bits': self.precision_bits,
+            'buckets': {str(bucket): count for bucket, count in self.buckets.items()},
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        histogram = cls(data.get('precision_bits', 7))
+        histogram.buckets = {int(bucket): count for bucket, count in data.get('buckets', {}).items()}
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total', 0)
+        histogram.min = data.get('min')
+        histogram.max = data.get('max')
+        return histogram
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import sqlite3
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from helpers.formatting import format_time
+
+DEFAULT_HISTORY_FILE = 'apisure-history.db'
+# Fewer previous samples than this are not enough to tell a regression from noise
+MIN_BASELINE_SAMPLES = 5
+# Robust z-score a sample must exceed, on top of the relative threshold, to count as a change
+SIGNIFICANCE = 3.0
+SAMPLE_BATCH_SIZE = 1000
+# Scales the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started REAL NOT NULL,
+        label TEXT,
+        complete INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS samples (
+        run_id INTEGER NOT NULL REFERENCES runs(id),
+        case_key TEXT NOT NULL,
+        method TEXT NOT NULL,
+        url TEXT NOT NULL,
+        seconds REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS samples_by_case ON samples (case_key, run_id);
+'''
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    # The description and assertions can change without making it a different request, so only the request counts
+    if 'history_id' in case:
+        return str(case['history_id'])
+    request = [case['method'].upper(), case['url'], case.get('params'), case.get('json')]
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def compare_to_baseline(seconds: float, baseline: List[float], threshold: float) -> Optional[Dict[str, Any]]:
+    """
+    Compare one latency sample with the samples of previous runs.
+
+    The sample is a regression when it is more than ``threshold`` (a fraction) slower than the baseline median and
+    also more than :data:`SIGNIFICANCE` scaled median absolute deviations away from it, so an endpoint with noisy
+    latency needs a bigger change before it is flagged. Returns ``None`` when there is not enough history.
+    """
+    if len(baseline) < MIN_BASELINE_SAMPLES:
+        return None
+    median = statistics.median(baseline)
+    spread = MAD_SCALE * statistics.median(abs(sample - median) for sample in baseline)
+    change = (seconds - median) / median if median > 0 else 0.0
+    significant = abs(seconds - median) > SIGNIFICANCE * spread
+
+    if significant and change > threshold:
+        verdict = 'regression'
+    elif significant and change < -threshold:
+        verdict = 'improvement'
+    else:
+        verdict = 'unchanged'
+    return {
+        'verdict': verdict,
+        'change': change,
+        'median': median,
+        'samples': len(baseline),
+        'message': f"{change:+.0%} against the baseline median of {format_time(median)} over {len(baseline)} samples "
+                   f"({verdict})"
+    }
+
+
+class HistoryStore:
+    """
+    Latency of every test case across runs, kept in a SQLite database.
+
+    Samples are written in batches while the run goes on, but a run only becomes part of later baselines once
+    :meth:`close` marks it complete; the samples of an aborted run are deleted.
+    """
+
+    def __init__(self, path: str, label: Optional[str] = None, baseline: Optional[str] = None, window: int = 20,
+                 threshold: float = 0.2) -> None:
+        self.path = path
+        self.label = label
+        self.baseline = baseline
+        self.window = window
+        self.threshold = threshold
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.executescript(SCHEMA)
+        with self._connection:
+            self.run_id = self._connection.execute('INSERT INTO runs (started, label) VALUES (?, ?)',
+                                                   (time.time(), label)).lastrowid
+        self._samples: List[Tuple[int, str, str, str, float]] = []
+
+    @property
+    def comparing(self) -> bool:
+        return self.baseline is not None
+
+    def baseline_samples(self, key: str) -> List[float]:
+        # The last `window` samples of the case, optionally only from runs with the given label
+        query = '''
+            SELECT samples.seconds FROM samples JOIN runs ON runs.id = samples.run_id
+            WHERE samples.case_key = ? AND runs.complete = 1 {label_filter}
+            ORDER BY samples.run_id DESC LIMIT ?
+        '''.format(label_filter='AND runs.label = ?' if self.baseline else '')
+        parameters = (key, self.baseline, self.window) if self.baseline else (key, self.window)
+        return [seconds for seconds, in self._connection.execute(query, parameters)]
+
+    def record(self, case: Dict[str, Any], seconds: float) -> Optional[Dict[str, Any]]:
+        key = case_key(case)
+        verdict = compare_to_baseline(seconds, self.baseline_samples(key), self.threshold) if self.comparing else None
+        self._samples.append((self.run_id, key, case['method'].upper(), case['url'], seconds))
+        if len(self._samples) >= SAMPLE_BATCH_SIZE:
+            self._flush()
+        return verdict
+
+    def _flush(self) -> None:
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO samples (run_id, case_key, method, url, seconds) VALUES (?, ?, ?, ?, ?)', self._samples)
+        self._samples = []
+
+    def close(self, save: bool = True) -> None:
+        if save:
+            self._flush()
+            with self._connection:
+                self._connection.execute('UPDATE runs SET complete = 1 WHERE id = ?', (self.run_id,))
+        else:
+            with self._connection:
+                self._connection.execute('DELETE FROM samples WHERE run_id = ?', (self.run_id,))
+                self._connection.execute('DELETE FROM runs WHERE id = ?', (self.run_id,))
+        self._connection.close()
+
+
+_history: Optional[HistoryStore] = None
+
+
+def configure_history(path: Optional[str], label: Optional[str] = None, baseline: Optional[str] = None,
+                      window: int = 20, threshold: float = 0.2) -> Optional[HistoryStore]:
+    global _history
+    if _history is not None:
+        _history.close(save=False)
+    _history = HistoryStore(path, label, baseline, window, threshold) if path else None
+    return _history
+
+
+def get_history() -> Optional[HistoryStore]:
+    return _history
+
+
+def close_history(save: bool = True) -> None:
+    global _history
+    if _history is not None:
+        _history.close(save)
+    _history = None
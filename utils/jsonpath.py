@@ -0,0 +1,69 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+WILDCARD = '*'
+
+Segment = Union[str, int]
+# A concrete location while walking a document, as (parent, segment) pairs so extending it allocates one small tuple
+Location = Optional[Tuple[Any, Segment]]
+
+_SEGMENT = re.compile(r'\.([^.\[\]]+)|\[(\*|-?\d+)\]|\[("(?:[^"\\]|\\.)*")\]')
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_-]*')
+
+
+@lru_cache(maxsize=None)
+def parse_path(path: str) -> Tuple[Segment, ...]:
+    """
+    Parse a path in the ``$.items[0].name`` form used in validation messages. ``*`` matches every key of an object
+    and ``[*]`` every element of an array, ``[-1]`` is the last element, and ``["a.b"]`` is a key with characters
+    that have a meaning in paths. The leading ``$`` is optional.
+    """
+    text = path[1:] if path.startswith('$') else path
+    if text and text[0] not in '.[':
+        text = '.' + text
+    segments: List[Segment] = []
+    position = 0
+    while position < len(text):
+        match = _SEGMENT.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid path '{path}'")
+        key, index, quoted = match.groups()
+        if quoted is not None:
+            segments.append(json.loads(quoted))
+        elif key is not None:
+            segments.append(key)
+        else:
+            segments.append(WILDCARD if index == WILDCARD else int(index))
+        position = match.end()
+    return tuple(segments)
+
+
+def format_segment(segment: Segment) -> str:
+    if isinstance(segment, int):
+        return f"[{segment}]"
+    if segment == WILDCARD:
+        return f"[{WILDCARD}]"
+    if _IDENTIFIER.fullmatch(segment):
+        return f".{segment}"
+    return f"[{json.dumps(segment, ensure_ascii=False)}]"
+
+
+def format_path(segments: Iterable[Segment]) -> str:
+    return '$' + ''.join(format_segment(segment) for segment in segments)
+
+
+def format_location(location: Location, rest: Iterable[Segment] = ()) -> str:
+    segments: List[Segment] = []
+    while location is not None:
+        location, segment = location
+        segments.append(segment)
+    segments.reverse()
+    segments.extend(rest)
+    return format_path(segments)
+
+
+def format_value(value: Any) -> str:
+    text = json.dumps(value, ensure_ascii=False, default=repr)
+    return text if len(text) <= 60 else text[:57] + '...'
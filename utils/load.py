@@ -0,0 +1,124 @@
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from helpers.formatting import format_time
+from utils.body import DEFAULT_MAX_BODY_SIZE
+from utils.histogram import LatencyHistogram
+from utils.request import make_request
+
+REPORTED_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def weighted_mix(cases: List[Tuple[int, Dict[str, Any]]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Smooth weighted round-robin: spreads heavy cases evenly instead of sending them in bursts
+    weights = [max(float(case.get('load_weight', 1)), 0) for _, case in cases]
+    total_weight = sum(weights)
+    if not total_weight:
+        return
+    current = [0.0] * len(cases)
+    while True:
+        for position, weight in enumerate(weights):
+            current[position] += weight
+        selected = max(range(len(cases)), key=current.__getitem__)
+        current[selected] -= total_weight
+        yield cases[selected]
+
+
+def run_load_test(cases: List[Tuple[int, Dict[str, Any]]], rps: float, duration: float, concurrency: int = 64,
+                  verify_ssl: bool = True, sample_rate: float = 0.01, max_samples: int = 20,
+                  max_body_size: int = DEFAULT_MAX_BODY_SIZE) -> Dict[str, Any]:
+    """
+    Drive ``cases`` open-loop at ``rps`` requests per second for ``duration`` seconds.
+
+    Every request has an intended start time on a fixed schedule and its latency is measured from that time rather
+    than from when it was actually sent, so queueing behind a slow server is counted instead of hidden (coordinated
+    omission). The service time, measured from the actual send, is recorded separately.
+    """
+    lock = threading.Lock()
+    stats = {
+        index: {'requests': 0, 'errors': 0, 'latency': LatencyHistogram(), 'service_time': LatencyHistogram()}
+        for index, _ in cases
+    }
+    samples: List[Tuple[int, Dict[str, Any], Future]] = []
+    sample_every = max(int(round(1 / sample_rate)), 1) if sample_rate > 0 else 0
+    total_requests = int(rps * duration)
+    interval = 1 / rps
+
+    def fire(index: int, case: Dict[str, Any], intended_start: float) -> Optional[Any]:
+        sent = time.perf_counter()
+        response = make_request(case['method'], case['url'], headers=case.get('headers', {}), json=case.get('json'),
+                                params=case.get('params'), retries=1, delay=0, timeout=case.get('timeout'),
+                                verify_ssl=verify_ssl, max_body_size=case.get('max_body_size', max_body_size),
+                                expected_status=case.get('expected_status'), tags=case.get('tags'))
+        finished = time.perf_counter()
+        # Latency counts the wait for the rate limiter, like any other queueing; the service time does not
+        throttled = sum(timing.get('throttled', 0) for timing in response.timings)
+
+        expected_status = case.get('expected_status')
+        failed = not isinstance(response, requests.Response) or bool(expected_status and response.status_code != expected_status)
+        with lock:
+            case_stats = stats[index]
+            case_stats['requests'] += 1
+            case_stats['errors'] += failed
+            case_stats['latency'].record(finished - intended_start)
+            case_stats['service_time'].record(finished - sent - throttled)
+        return response
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for number, (index, case) in zip(range(total_requests), weighted_mix(cases)):
+            intended_start = start + number * interval
+            wait = intended_start - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            future = executor.submit(fire, index, case, intended_start)
+            if sample_every and number % sample_every == 0 and len(samples) < max_samples:
+                samples.append((index, case, future))
+    elapsed = time.perf_counter() - start
+
+    latency = LatencyHistogram()
+    service_time = LatencyHistogram()
+    for case_stats in stats.values():
+        latency.merge(case_stats['latency'])
+        service_time.merge(case_stats['service_time'])
+
+    return {
+        'target_rps': rps,
+        'duration': elapsed,
+        'requests': sum(case_stats['requests'] for case_stats in stats.values()),
+        'errors': sum(case_stats['errors'] for case_stats in stats.values()),
+        'latency': latency,
+        'service_time': service_time,
+        'cases': [dict(stats[index], id=index, case=case) for index, case in cases],
+        'samples': [(index, case, future.result()) for index, case, future in samples],
+    }
+
+
+def load_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    def percentile_rows(histogram: LatencyHistogram) -> List[Tuple[str, str]]:
+        rows = [(f"p{percentile:g}", format_time(value))
+                for percentile, value in histogram.percentiles(REPORTED_PERCENTILES).items()]
+        rows.append(('max', format_time((histogram.max or 0) / 1_000_000)))
+        return rows
+
+    requests_sent = result['requests']
+    return {
+        'target_rps': f"{result['target_rps']:g} req/s",
+        'throughput': f"{requests_sent / result['duration'] if result['duration'] else 0:.2f} req/s",
+        'requests': requests_sent,
+        'errors': result['errors'],
+        'error_rate': f"{result['errors'] / requests_sent * 100 if requests_sent else 0:.2f}%",
+        'duration': format_time(result['duration']),
+        'latency': percentile_rows(result['latency']),
+        'service_time': percentile_rows(result['service_time']),
+        'cases': [{
+            'id': case_stats['id'],
+            'description': case_stats['case'].get('description', f"Test Case {case_stats['id']}"),
+            'requests': case_stats['requests'],
+            'errors': case_stats['errors'],
+            'latency': percentile_rows(case_stats['latency']),
+        } for case_stats in result['cases']],
+    }
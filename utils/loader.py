@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Union
+
+from utils.codec import json_loads
+
+JSON_LINES_EXTENSIONS = {'.jsonl', '.ndjson'}
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+# Characters that can continue a number, so a number followed by one of them may be cut at the end of a chunk
+_NUMBER_CHARACTERS = frozenset('.eE+-0123456789')
+
+
+class _ChunkReader:
+    def __init__(self, read: Callable[[int], str]) -> None:
+        self.read = read
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self, size: int = CHUNK_SIZE) -> bool:
+        if self.eof:
+            return False
+        chunk = self.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def decode(self) -> Any:
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+                # A number at the end of the buffer may continue in the next chunk, and so may one cut right after
+                # its '.', 'e' or exponent sign (``3.`` decodes as 3 and leaves the '.')
+                if self.eof or (end < len(self.buffer) and not (
+                        isinstance(value, (int, float)) and self.buffer[end] in _NUMBER_CHARACTERS)):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow the read size with the pending value so a huge element is re-scanned a logarithmic number of times
+            if not self.fill(max(CHUNK_SIZE, len(self.buffer) - self.position)):
+                value, self.position = _decoder.raw_decode(self.buffer, self.position)
+                return value
+
+
+def iter_json_array(read: Callable[[int], str]) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    ``read(size)`` returns the next chunk of text, or an empty string at the end of the input, so only the element
+    being decoded is ever held in memory.
+    """
+    reader = _ChunkReader(read)
+    if reader.peek() != '[':
+        raise json.JSONDecodeError("Expected a JSON array", reader.buffer, reader.position)
+    reader.position += 1
+
+    if reader.peek() == ']':
+        reader.position += 1
+        return
+    while True:
+        reader.peek()
+        yield reader.decode()
+        separator = reader.peek()
+        reader.position += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise json.JSONDecodeError("Expected ',' or ']' between array elements", reader.buffer,
+                                       reader.position - 1)
+
+
+def iter_json_lines(lines: Iterable[str]) -> Iterator[Any]:
+    for line in lines:
+        if line.strip():
+            yield json_loads(line)
+
+
+def _iter_file(path: str, parse: Callable[[IO[str]], Iterator[Any]]) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r') as file:
+        yield from parse(file)
+
+
+def is_json_lines(path: str) -> bool:
+    if os.path.splitext(path)[1].lower() in JSON_LINES_EXTENSIONS:
+        return True
+    with open(path, 'r') as file:
+        return _ChunkReader(file.read).peek() == '{'
+
+
+def load_test_cases(path: str, stream: bool = False) -> Union[List[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+    if is_json_lines(path):
+        return _iter_file(path, iter_json_lines)
+    if stream:
+        return _iter_file(path, lambda file: iter_json_array(file.read))
+    with open(path, 'rb') as file:
+        return json_loads(file.read())
@@ -0,0 +1,127 @@
+import bisect
+import os
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from helpers.output import print_info
+from utils.profiling import get_profiler
+from utils.report import Reporter
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: str) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def endpoint(method: str, url: str) -> str:
+    # The query string is left out so that every distinct parameter value does not become its own time series
+    parts = urlsplit(url)
+    return f"{method} {parts.netloc}{parts.path or '/'}"
+
+
+class MetricsReporter(Reporter):
+    """
+    Writes an OpenMetrics (Prometheus text format) file with a response time histogram, retry count, rate limiter wait
+    and pass/fail count per endpoint, plus the time per stage when ``--profile`` is on. The file is replaced in one
+    step when the run finishes, so a scraper never reads a half-written export.
+    """
+    name = 'OpenMetrics export'
+
+    def __init__(self, output_file: str = "metrics.prom") -> None:
+        super().__init__(output_file)
+        self._durations: Dict[str, List[float]] = {}
+        self._retries: Dict[str, int] = {}
+        self._throttled: Dict[str, float] = {}
+        self._results: Dict[Tuple[str, str], int] = {}
+
+    def start(self) -> None:
+        self._durations = {}
+        self._retries = {}
+        self._throttled = {}
+        self._results = {}
+
+    def add_test_case(self, case: Dict[str, Any]) -> None:
+        key = endpoint(case['method'], case['url'])
+        result = 'passed' if case['passed'] else 'failed'
+        self._results[(key, result)] = self._results.get((key, result), 0) + 1
+        # A reused result was not measured in this run
+        if case.get('cached'):
+            return
+        timings = case.get('timings', [])
+        seconds = case.get('response_seconds')
+        if seconds is None:
+            if not timings:
+                return
+            # A request that failed has no response time, so its last attempt stands in for it, up to the headers
+            # like the response time
+            seconds = timings[-1]['total'] - timings[-1]['download']
+
+        histogram = self._durations.get(key)
+        if histogram is None:
+            # One count per bucket, then the sum and the count of all observations
+            histogram = self._durations[key] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0, 0]
+        histogram[bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+        self._retries[key] = self._retries.get(key, 0) + max(len(timings) - 1, 0)
+        self._throttled[key] = self._throttled.get(key, 0.0) + case.get('throttled_seconds', 0.0)
+
+    def finish(self, test_results: Dict[str, Any]) -> None:
+        temporary_file = f"{self.output_file}.tmp"
+        with open(temporary_file, 'w') as file:
+            file.write(self.render())
+        os.replace(temporary_file, self.output_file)
+        print_info(f"{self.name} generated", self.output_file)
+
+    def abort(self) -> None:
+        pass
+
+    def test_case(self, case: Dict[str, Any]) -> str:
+        return ''
+
+    def render(self) -> str:
+        lines = ['# TYPE apisure_request_duration_seconds histogram',
+                 '# UNIT apisure_request_duration_seconds seconds',
+                 '# HELP apisure_request_duration_seconds Response time of the test case requests, or the '
+                 'time of the last attempt of a failed one.']
+        for key, histogram in sorted(self._durations.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + (None,), histogram):
+                cumulative += count
+                le = '+Inf' if bound is None else repr(float(bound))
+                lines.append(f"apisure_request_duration_seconds_bucket{_labels(endpoint=key, le=le)} {cumulative}")
+            lines.append(f"apisure_request_duration_seconds_sum{_labels(endpoint=key)} {histogram[-2]}")
+            lines.append(f"apisure_request_duration_seconds_count{_labels(endpoint=key)} {histogram[-1]}")
+
+        lines += ['# TYPE apisure_request_retries counter',
+                  '# HELP apisure_request_retries Requests sent again after a failed attempt.']
+        lines += [f"apisure_request_retries_total{_labels(endpoint=key)} {count}"
+                  for key, count in sorted(self._retries.items())]
+
+        lines += ['# TYPE apisure_rate_limit_wait_seconds counter',
+                  '# UNIT apisure_rate_limit_wait_seconds seconds',
+                  '# HELP apisure_rate_limit_wait_seconds Time requests waited for the rate limiter.']
+        lines += [f"apisure_rate_limit_wait_seconds_total{_labels(endpoint=key)} {seconds}"
+                  for key, seconds in sorted(self._throttled.items())]
+
+        lines += ['# TYPE apisure_test_cases counter',
+                  '# HELP apisure_test_cases Test cases by result.']
+        lines += [f"apisure_test_cases_total{_labels(endpoint=key, result=result)} {count}"
+                  for (key, result), count in sorted(self._results.items())]
+
+        profiler = get_profiler()
+        if profiler is not None:
+            lines += ['# TYPE apisure_stage_seconds counter',
+                      '# UNIT apisure_stage_seconds seconds',
+                      '# HELP apisure_stage_seconds Time spent in each stage of the run.']
+            for row in profiler.summary():
+                lines.append(f"apisure_stage_seconds_total{_labels(stage=row['stage'], clock='wall')} {row['wall']}")
+                lines.append(f"apisure_stage_seconds_total{_labels(stage=row['stage'], clock='cpu')} {row['cpu']}")
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
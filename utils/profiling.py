@@ -0,0 +1,80 @@
+import contextlib
+import threading
+import time
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+_NOT_PROFILING = contextlib.nullcontext()
+
+
+class StageProfiler:
+    """
+    Wall and CPU time spent in each stage of a run.
+
+    CPU time is the time of the calling thread, so a request stage shows how much of its wall time was spent waiting
+    on the network rather than in ApiSure. Stages may nest; each one is timed in full.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            totals = self.stages.get(name)
+            if totals is None:
+                totals = self.stages[name] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+
+    def summary(self) -> List[Dict[str, float]]:
+        with self._lock:
+            rows = [{'stage': name, 'calls': calls, 'wall': wall, 'cpu': cpu}
+                    for name, (calls, wall, cpu) in self.stages.items()]
+        return sorted(rows, key=lambda row: row['wall'], reverse=True)
+
+
+_profiler: Optional[StageProfiler] = None
+
+
+def configure_profiler(enabled: bool) -> Optional[StageProfiler]:
+    global _profiler
+    _profiler = StageProfiler() if enabled else None
+    return _profiler
+
+
+def get_profiler() -> Optional[StageProfiler]:
+    return _profiler
+
+
+def profile_stage(name: str) -> ContextManager[None]:
+    # Costs one global lookup when profiling is off
+    if _profiler is None:
+        return _NOT_PROFILING
+    return _profiler.stage(name)
+
+
+def profile_iteration(name: str, items: Iterable[T]) -> Iterator[T]:
+    # Times only the work of producing each item, such as parsing a streamed test case
+    if _profiler is None:
+        yield from items
+        return
+    iterator = iter(items)
+    while True:
+        with _profiler.stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,158 @@
+import contextlib
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+TAG_PREFIX = 'tag:'
+
+
+def parse_limit(value: str, integer: bool = False) -> Tuple[str, float]:
+    """
+    Parse ``[TARGET=]NUMBER``, where the target is a host (``api.example.com`` or ``api.example.com:8443``) or a test
+    case tag (``tag:search``). Without a target the limit applies to every host separately and is returned with an
+    empty target.
+    """
+    target, _, number = value.rpartition('=')
+    try:
+        limit = int(number) if integer else float(number)
+    except ValueError:
+        limit = 0
+    if limit <= 0 or target == TAG_PREFIX:
+        raise ValueError(f"Invalid limit '{value}', expected [HOST=]N or tag:NAME=N with N above 0"
+                         f"{' and a whole number' if integer else ''} (for example 20 or api.example.com=20)")
+    return target.lower() if not target.startswith(TAG_PREFIX) else target, limit
+
+
+class TokenBucket:
+    """
+    Paces requests to ``rate`` per second, letting up to ``burst`` through at once after an idle period.
+
+    A caller reserves its token up front and is told how long to wait for it, so concurrent callers queue in order
+    instead of polling.
+    """
+
+    def __init__(self, rate: float, burst: float = 1) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Requests per second and requests in flight, limited per host and per test case tag.
+
+    Limits without a target apply to every host on its own; a limit for a particular host replaces them for that host.
+    Tag limits are shared by all test cases with the tag, on top of the host limits. A host that answered 429 Too Many
+    Requests is paused for every caller until its ``Retry-After`` has passed, not just for the request that got it.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, in_flight: Optional[Dict[str, int]] = None) -> None:
+        self.rates = rates or {}
+        self.in_flight = in_flight or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def _target(self, limits: Dict[str, float], host: str) -> Optional[str]:
+        if host in limits:
+            return host
+        hostname = host.rpartition(':')[0] if ':' in host and not host.endswith(']') else host
+        if hostname in limits:
+            return hostname
+        # The default limit keeps a bucket per host
+        return host if '' in limits else None
+
+    def _keys(self, limits: Dict[str, float], host: str, tags: Iterable[str]) -> List[Tuple[str, float]]:
+        keys = []
+        target = self._target(limits, host)
+        if target is not None:
+            keys.append((host, limits.get(target, limits.get(''))))
+        for tag in tags:
+            limit = limits.get(TAG_PREFIX + tag)
+            if limit is not None:
+                keys.append((TAG_PREFIX + tag, limit))
+        return keys
+
+    def _bucket(self, key: str, rate: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(rate))
+        return bucket
+
+    def _slot(self, key: str, size: float) -> threading.BoundedSemaphore:
+        slot = self._slots.get(key)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.setdefault(key, threading.BoundedSemaphore(int(size)))
+        return slot
+
+    @contextlib.contextmanager
+    def limit(self, host: str, tags: Optional[Iterable[str]] = None) -> Iterator[float]:
+        """Wait until a request to ``host`` may be sent and hold its in-flight slots; yields the seconds waited."""
+        waited, slots = self.acquire(host, tags or ())
+        try:
+            yield waited
+        finally:
+            self.release(slots)
+
+    def acquire(self, host: str, tags: Iterable[str] = ()) -> Tuple[float, List[threading.BoundedSemaphore]]:
+        if not self.rates and not self.in_flight and not self._paused_until:
+            return 0.0, []
+        started = time.perf_counter()
+
+        # Always taken in the same order, so two callers can never hold each other's slots
+        slots = [self._slot(key, size) for key, size in sorted(self._keys(self.in_flight, host, tags))]
+        for slot in slots:
+            slot.acquire()
+
+        wait = max([self._bucket(key, rate).reserve() for key, rate in self._keys(self.rates, host, tags)],
+                   default=0.0)
+        paused_until = self._paused_until.get(host)
+        if paused_until is not None:
+            wait = max(wait, paused_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+        return time.perf_counter() - started, slots
+
+    @staticmethod
+    def release(slots: List[threading.BoundedSemaphore]) -> None:
+        for slot in slots:
+            slot.release()
+
+    def pause(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self._paused_until[host] = max(self._paused_until.get(host, 0.0), time.monotonic() + seconds)
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def configure_rate_limiter(rates: Optional[Dict[str, float]] = None,
+                           in_flight: Optional[Dict[str, int]] = None) -> RateLimiter:
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rates, in_flight)
+    return _rate_limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
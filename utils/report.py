@@ -1,11 +1,18 @@
-from typing import Dict, Any
+from abc import ABC, abstractmethod
+from typing import Dict, Any, IO, Iterable, List, Optional
 from jinja2 import Template
 from datetime import datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
+import json
 
+from helpers.output import print_info
+from utils.profiling import profile_stage
 
-def generate_html_report(test_results: Dict[str, Any], output_file: str = "report.html") -> None:
-    # HTML template using Jinja2
-    template = Template('''
+
+# The HTML report is written in three parts so test cases can be appended as they finish. The summary is only known at
+# the end, so it is written last and moved to the top with CSS.
+HTML_HEADER = '''
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -13,7 +20,7 @@ def generate_html_report(test_results: Dict[str, Any], output_file: str = "repor
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>API Test Report</title>
         <style>
-            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 1200px; margin: 0 auto; padding: 20px; }
+            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 1200px; margin: 0 auto; padding: 20px; display: flex; flex-direction: column; }
             h1, h2 { color: #2c3e50; }
             .summary { background-color: #ecf0f1; padding: 20px; border-radius: 5px; margin-bottom: 20px; }
             table { width: 100%; border-collapse: collapse; margin-bottom: 20px; }
@@ -30,10 +37,87 @@ def generate_html_report(test_results: Dict[str, Any], output_file: str = "repor
             .warning { color: #f39c12; }
             .status-passed { color: #2ecc71; font-weight: bold; }
             .status-failed { color: #e74c3c; font-weight: bold; }
+            h1 { order: -2; }
+            .summary { order: -1; }
+            .partial { color: #f39c12; font-weight: bold; }
         </style>
     </head>
     <body>
         <h1>API Test Report</h1>
+        <p class="partial">The test run has not finished, so this report is incomplete.</p>
+        <h2>Test Case Details</h2>
+'''
+
+HTML_TEST_CASE = '''        <div class="test-case {{ test.status.lower() }}">
+            <h3>Test Case {{ test.id }}: {{ test.description }}</h3>
+            <table>
+                <tr>
+                    <th>Property</th>
+                    <th>Value</th>
+                </tr>
+                <tr>
+                    <td>Status</td>
+                    <td class="status-{{ test.status.lower() }}">{{ test.status }}</td>
+                </tr>
+                <tr>
+                    <td>Method</td>
+                    <td>{{ test.method }}</td>
+                </tr>
+                <tr>
+                    <td>URL</td>
+                    <td>{{ test.url }}</td>
+                </tr>
+                <tr>
+                    <td>Status Code</td>
+                    <td>{{ test.status_code }}{% if test.expected_status %} (Expected: {{ test.expected_status }}){% endif %}</td>
+                </tr>
+                <tr>
+                    <td>Response Time</td>
+                    <td>{{ test.response_time }}</td>
+                </tr>
+                <tr>
+                    <td>Content Length</td>
+                    <td>{{ test.content_length }}</td>
+                </tr>
+                {% if test.cached %}
+                <tr>
+                    <td>Result</td>
+                    <td>Reused from an earlier run</td>
+                </tr>
+                {% endif %}
+                {% if test.baseline %}
+                <tr>
+                    <td>Baseline</td>
+                    <td>{{ test.baseline }}</td>
+                </tr>
+                {% endif %}
+                {% if test.timing %}
+                <tr>
+                    <td>Timing Breakdown</td>
+                    <td>{{ test.timing }}{% if test.attempts > 1 %} ({{ test.attempts }} attempts){% endif %}</td>
+                </tr>
+                {% endif %}
+                {% if test.throttled %}
+                <tr>
+                    <td>Rate Limit Wait</td>
+                    <td>{{ test.throttled }}</td>
+                </tr>
+                {% endif %}
+            </table>
+            {% if test.validation_results %}
+            <div class="details">
+                <h4>Validation Results</h4>
+                <ul>
+                {% for result in test.validation_results %}
+                    <li class="{{ result.type }}">{{ result.message }}</li>
+                {% endfor %}
+                </ul>
+            </div>
+            {% endif %}
+        </div>
+'''
+
+HTML_SUMMARY = '''        <style>.partial { display: none; }</style>
         <div class="summary">
             <h2>Summary</h2>
             <table>
@@ -65,103 +149,294 @@ def generate_html_report(test_results: Dict[str, Any], output_file: str = "repor
                     <td>Average Content Length</td>
                     <td>{{ summary.avg_content_length }}</td>
                 </tr>
+                {% if summary.cached %}
+                <tr>
+                    <td>Reused Results</td>
+                    <td>{{ summary.cached }}</td>
+                </tr>
+                {% endif %}
+                {% if summary.throttled %}
+                <tr>
+                    <td>Rate Limit Wait</td>
+                    <td>{{ summary.throttled }}</td>
+                </tr>
+                {% endif %}
+                {% if summary.baseline %}
+                <tr>
+                    <td>Performance Baseline</td>
+                    <td>{{ summary.baseline }}</td>
+                </tr>
+                {% endif %}
+                {% if summary.connection_reuse %}
+                <tr>
+                    <td>Connection Reuse</td>
+                    <td>{{ summary.connection_reuse }}</td>
+                </tr>
+                {% endif %}
                 <tr>
                     <td>Report Generated</td>
                     <td>{{ summary.timestamp }}</td>
                 </tr>
             </table>
         </div>
-        <h2>Test Case Details</h2>
-        {% for test in test_cases %}
-        <div class="test-case {{ test.status.lower() }}">
-            <h3>Test Case {{ test.id }}: {{ test.description }}</h3>
+        {% if load %}
+        <div class="summary load">
+            <h2>Load Test</h2>
             <table>
                 <tr>
-                    <th>Property</th>
+                    <th>Metric</th>
                     <th>Value</th>
                 </tr>
                 <tr>
-                    <td>Status</td>
-                    <td class="status-{{ test.status.lower() }}">{{ test.status }}</td>
+                    <td>Target Rate</td>
+                    <td>{{ load.target_rps }}</td>
                 </tr>
                 <tr>
-                    <td>Method</td>
-                    <td>{{ test.method }}</td>
+                    <td>Throughput</td>
+                    <td>{{ load.throughput }}</td>
                 </tr>
                 <tr>
-                    <td>URL</td>
-                    <td>{{ test.url }}</td>
+                    <td>Duration</td>
+                    <td>{{ load.duration }}</td>
                 </tr>
                 <tr>
-                    <td>Status Code</td>
-                    <td>{{ test.status_code }}{% if test.expected_status %} (Expected: {{ test.expected_status }}){% endif %}</td>
+                    <td>Requests</td>
+                    <td>{{ load.requests }}</td>
                 </tr>
                 <tr>
-                    <td>Response Time</td>
-                    <td>{{ test.response_time }}</td>
+                    <td>Errors</td>
+                    <td>{{ load.errors }} ({{ load.error_rate }})</td>
                 </tr>
+                {% for label, value in load.latency %}
                 <tr>
-                    <td>Content Length</td>
-                    <td>{{ test.content_length }}</td>
+                    <td>Latency {{ label }}</td>
+                    <td>{{ value }}</td>
                 </tr>
+                {% endfor %}
             </table>
-            {% if test.validation_results %}
-            <div class="details">
-                <h4>Validation Results</h4>
-                <ul>
-                {% for result in test.validation_results %}
-                    <li class="{{ result.type }}">{{ result.message }}</li>
+            <h3>Per Test Case</h3>
+            <table>
+                <tr>
+                    <th>Test Case</th>
+                    <th>Requests</th>
+                    <th>Errors</th>
+                    {% for label, value in load.latency %}
+                    <th>{{ label }}</th>
+                    {% endfor %}
+                </tr>
+                {% for case in load.cases %}
+                <tr>
+                    <td>{{ case.id }}: {{ case.description }}</td>
+                    <td>{{ case.requests }}</td>
+                    <td>{{ case.errors }}</td>
+                    {% for label, value in case.latency %}
+                    <td>{{ value }}</td>
+                    {% endfor %}
+                </tr>
                 {% endfor %}
-                </ul>
-            </div>
-            {% endif %}
+            </table>
         </div>
-        {% endfor %}
+        {% endif %}
     </body>
     </html>
-    ''')
+'''
+
+
+@lru_cache(maxsize=None)
+def get_template(source: str) -> Template:
+    return Template(source)
+
+
+def prepare_test_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    validation_results = []
+    if 'validation_results' in case:
+        for result in case['validation_results']:
+            result_type = 'error' if not result['passed'] else 'warning' if 'warning' in result else ''
+            validation_results.append({
+                'type': result_type,
+                'message': result['message']
+            })
+
+    return {
+        'id': case['id'],
+        'description': case['description'],
+        'method': case['method'],
+        'url': case['url'],
+        'status': 'Passed' if case['passed'] else 'Failed',
+        'status_code': case.get('status_code'),
+        'expected_status': case.get('expected_status'),
+        'response_time': case.get('response_time'),
+        'content_length': case.get('content_length'),
+        'timing': case.get('timing'),
+        'attempts': len(case.get('timings', [])),
+        'baseline': case.get('baseline'),
+        'cached': case.get('cached', False),
+        'throttled': case.get('throttled'),
+        'validation_results': validation_results
+    }
+
 
-    # Prepare summary data for the report
-    summary = {
+def prepare_summary(test_results: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         'total': test_results['total_tests'],
         'executed': test_results['executed_tests'],
         'passed': test_results['pass'],
         'failed': test_results['fail'],
         'avg_response_time': test_results['avg_response_time'],
         'avg_content_length': test_results['avg_content_length'],
+        'connection_reuse': test_results.get('connection_reuse'),
+        'baseline': test_results.get('baseline'),
+        'cached': test_results.get('cached'),
+        'throttled': test_results.get('throttled'),
         'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    # Prepare test cases data for the report
-    test_cases = []
-    for case in test_results['test_cases']:
-        validation_results = []
-        if 'validation_results' in case:
-            for result in case['validation_results']:
-                result_type = 'error' if not result['passed'] else 'warning' if 'warning' in result else ''
-                validation_results.append({
-                    'type': result_type,
-                    'message': result['message']
-                })
-
-        test_cases.append({
-            'id': case['id'],
-            'description': case['description'],
-            'method': case['method'],
-            'url': case['url'],
-            'status': 'Passed' if case['passed'] else 'Failed',
-            'status_code': case.get('status_code'),
-            'expected_status': case.get('expected_status'),
-            'response_time': case.get('response_time'),
-            'content_length': case.get('content_length'),
-            'validation_results': validation_results
-        })
-
-    # Render the template with the prepared data
-    html_content = template.render(summary=summary, test_cases=test_cases)
-
-    # Write the rendered HTML to a file
-    with open(output_file, 'w') as f:
-        f.write(html_content)
-
-    print(f"HTML report generated: {output_file}")
+
+class Reporter(ABC):
+    """
+    Writes a report incrementally: :meth:`add_test_case` is called as soon as each test case finishes and flushes it
+    to disk, so a partial report survives an aborted run.
+    """
+    name = 'Report'
+
+    def __init__(self, output_file: str) -> None:
+        self.output_file = output_file
+        self._file: Optional[IO[str]] = None
+
+    def start(self) -> None:
+        self._file = open(self.output_file, 'w')
+        self._write(self.header())
+
+    def add_test_case(self, case: Dict[str, Any]) -> None:
+        with profile_stage('report'):
+            self._write(self.test_case(case))
+
+    def finish(self, test_results: Dict[str, Any]) -> None:
+        with profile_stage('report'):
+            self._write(self.footer(test_results))
+            self._close()
+        print_info(f"{self.name} generated", self.output_file)
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._write(self.footer(None))
+            self._close()
+
+    def _write(self, text: str) -> None:
+        if text:
+            self._file.write(text)
+            self._file.flush()
+
+    def _close(self) -> None:
+        self._file.close()
+        self._file = None
+
+    def header(self) -> str:
+        return ''
+
+    @abstractmethod
+    def test_case(self, case: Dict[str, Any]) -> str:
+        ...
+
+    def footer(self, test_results: Optional[Dict[str, Any]]) -> str:
+        return ''
+
+
+class HtmlReporter(Reporter):
+    name = 'HTML report'
+
+    def __init__(self, output_file: str = "report.html") -> None:
+        super().__init__(output_file)
+
+    def header(self) -> str:
+        return get_template(HTML_HEADER).render()
+
+    def test_case(self, case: Dict[str, Any]) -> str:
+        return get_template(HTML_TEST_CASE).render(test=prepare_test_case(case))
+
+    def footer(self, test_results: Optional[Dict[str, Any]]) -> str:
+        if test_results is None:
+            return '    </body>\n    </html>\n'
+        return get_template(HTML_SUMMARY).render(summary=prepare_summary(test_results), load=test_results.get('load'))
+
+
+class JUnitReporter(Reporter):
+    name = 'JUnit report'
+    # The counts are only known at the end; they are written over this blank space inside the opening tag
+    COUNTS_PLACEHOLDER = ' ' * 96
+
+    def __init__(self, output_file: str = "report.xml") -> None:
+        super().__init__(output_file)
+        self.tests = 0
+        self.failures = 0
+        self.time = 0.0
+        self._counts_offset = 0
+
+    def start(self) -> None:
+        timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        self.tests = 0
+        self.failures = 0
+        self.time = 0.0
+        self._file = open(self.output_file, 'w')
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n'
+                         f'  <testsuite name="ApiSure" timestamp="{timestamp}"')
+        self._counts_offset = self._file.tell()
+        self._write(self.COUNTS_PLACEHOLDER + '>\n')
+
+    def test_case(self, case: Dict[str, Any]) -> str:
+        self.tests += 1
+        seconds = case.get('response_seconds', 0) or 0
+        self.time += seconds
+        name = quoteattr(f"{case['id']}: {case['description']}")
+        classname = quoteattr(f"{case['method']} {case['url']}")
+        lines = [f'    <testcase name={name} classname={classname} time="{seconds:.3f}"']
+        errors = [result['message'] for result in case.get('validation_results', []) if not result['passed']]
+        if case['passed']:
+            lines[0] += '/>'
+        else:
+            self.failures += 1
+            lines[0] += '>'
+            message = quoteattr(errors[0] if errors else 'Test case failed')
+            details = escape('\n'.join(errors))
+            lines.append(f'      <failure message={message}>{details}</failure>')
+            lines.append('    </testcase>')
+        return '\n'.join(lines) + '\n'
+
+    def footer(self, test_results: Optional[Dict[str, Any]]) -> str:
+        return '  </testsuite>\n</testsuites>\n'
+
+    def _close(self) -> None:
+        counts = f' tests="{self.tests}" failures="{self.failures}" errors="0" time="{self.time:.3f}"'
+        self._file.seek(self._counts_offset)
+        self._file.write(counts.ljust(len(self.COUNTS_PLACEHOLDER)))
+        super()._close()
+
+
+class NdjsonReporter(Reporter):
+    name = 'NDJSON report'
+
+    def __init__(self, output_file: str = "report.ndjson") -> None:
+        super().__init__(output_file)
+
+    def test_case(self, case: Dict[str, Any]) -> str:
+        return json.dumps(dict(case, type='test_case')) + '\n'
+
+    def footer(self, test_results: Optional[Dict[str, Any]]) -> str:
+        if test_results is None:
+            return json.dumps({'type': 'aborted'}) + '\n'
+        summary = {key: value for key, value in test_results.items() if key != 'test_cases'}
+        return json.dumps(dict(summary, type='summary')) + '\n'
+
+
+def generate_html_report(test_results: Dict[str, Any], output_file: str = "report.html") -> None:
+    write_reports([HtmlReporter(output_file)], test_results, test_results['test_cases'])
+
+
+def write_reports(reporters: List[Reporter], test_results: Dict[str, Any], test_cases: Iterable[Dict[str, Any]]) -> None:
+    for reporter in reporters:
+        reporter.start()
+    for case in test_cases:
+        for reporter in reporters:
+            reporter.add_test_case(case)
+    for reporter in reporters:
+        reporter.finish(test_results)
@@ -1,8 +1,50 @@
 import requests
 import time
 from requests.exceptions import RequestException, SSLError
-from typing import Optional, Any
-from helpers.output import print_error, print_warning
+from typing import Optional, Any, Dict, Iterable, List, Union
+from helpers.output import print_warning
+from utils.body import DEFAULT_MAX_BODY_SIZE
+from utils.cassette import Cassette, get_cassette, request_key
+from utils.profiling import profile_stage
+from utils.ratelimit import get_rate_limiter
+from utils.retry import RetryPolicy, error_status, get_circuit_breaker, is_host_failure
+from utils.timing import RequestTiming, start_timing, current_timing, finish_timing
+from utils.transport import get_transport
+
+
+class RequestFailure:
+    """
+    A request that got no usable response: the reason, and the phase timings of every attempt, so a failed test case
+    reports its attempts like one that got a response.
+    """
+
+    __slots__ = ('error', 'timings')
+
+    def __init__(self, error: str, timings: List[Dict[str, Any]]) -> None:
+        self.error = error
+        self.timings = timings
+
+
+def _record_failure(timings: List[Dict[str, Any]], timing: RequestTiming, error: Exception) -> None:
+    if current_timing() is timing:
+        timings.append(finish_timing(timing, error))
+    else:
+        # The response arrived, but its status was rejected
+        timings[-1]['error'] = str(error)
+
+
+def _replay(cassette: Cassette, key: str, occurrence: int, method: str, url: str, max_body_size: int,
+            expected_status: Optional[int]) -> Union[requests.Response, RequestFailure]:
+    # A replay is deterministic, so retrying a recorded failure would only return it again
+    response = cassette.replay(key, occurrence, max_body_size)
+    if response is None:
+        return RequestFailure(f"No recorded response for {method} {url} in cassette {cassette.path}", [])
+    try:
+        if response.status_code != expected_status:
+            response.raise_for_status()
+    except RequestException as e:
+        return RequestFailure(f"Recorded request failed: {e}", [])
+    return response
 
 
 def make_request(
@@ -12,22 +54,72 @@ def make_request(
         delay: float = 2,
         timeout: Optional[int] = None,
         verify_ssl: bool = True,
+        max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+        expected_status: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None,
         **kwargs: Any
-) -> Optional[requests.Response]:
-    for attempt in range(retries):
+) -> Union[requests.Response, RequestFailure]:
+    cassette = get_cassette()
+    if cassette is not None:
+        key = request_key(method, url, kwargs.get('params'), kwargs.get('json'), kwargs.get('data'))
+        occurrence = cassette.next_occurrence(key)
+        if cassette.replaying:
+            with profile_stage('replay'):
+                return _replay(cassette, key, occurrence, method, url, max_body_size, expected_status)
+
+    transport = get_transport()
+    policy = RetryPolicy(retries, delay)
+    breaker = get_circuit_breaker()
+    limiter = get_rate_limiter()
+    host = breaker.host(url)
+    timings: List[Dict[str, Any]] = []
+    for attempt in range(1, retries + 1):
+        if not breaker.allow(host):
+            return RequestFailure(f"Circuit open for {host} after repeated failures, not sent", timings)
+
         try:
-            response = requests.request(method, url, timeout=timeout, verify=verify_ssl, **kwargs)
-            response.raise_for_status()
+            # Client setup, such as building an SSL context, is not part of the request's time
+            transport.prepare(url, verify_ssl)
+            with limiter.limit(host, tags) as throttled:
+                timing = start_timing(attempt)
+                timing.throttled = throttled
+                with profile_stage('request'):
+                    response = transport.send(method, url, timeout, verify_ssl, max_body_size, **kwargs)
+            timings.append(finish_timing(timing))
+            # Phase timings of every attempt, the last one being this response
+            response.timings = timings
+            if cassette is not None:
+                cassette.record(key, occurrence, response)
+            # An error status the test case expects is a successful request
+            if response.status_code != expected_status:
+                response.raise_for_status()
+            breaker.record_success(host)
             return response
         except SSLError as e:
-            print_error(f"SSL Error occurred: {e}")
+            _record_failure(timings, timing, e)
+            # The host answered, the handshake failed
+            breaker.record_success(host)
             if not verify_ssl:
                 print_warning("SSL verification is disabled. This is not recommended for production use.")
-            return None
+            return RequestFailure(f"SSL error: {e}", timings)
         except RequestException as e:
-            if attempt < retries - 1:
-                print_warning(f"Request failed (attempt {attempt + 1}/{retries}): {e}")
-                time.sleep(delay)
+            _record_failure(timings, timing, e)
+            if is_host_failure(e):
+                breaker.record_failure(host)
             else:
-                print_error(f"Request failed after {retries} attempts: {e}")
-                return None
+                breaker.record_success(host)
+
+            wait = policy.next_delay(attempt, e)
+            if wait is None:
+                return RequestFailure(str(e), timings)
+            if error_status(e) == 429:
+                # Hold back the other requests to this host too, instead of letting each of them run into the limit
+                limiter.pause(host, wait)
+            # The retry is reported with the test case, from the error and the wait kept in its timings
+            timings[-1]['retry_in'] = wait
+            time.sleep(wait)
+        except BaseException:
+            # Never leave a trial request of the circuit breaker outstanding, or the host stays blocked for the run
+            breaker.abandon(host)
+            raise
+    return RequestFailure("No attempt was made", timings)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.codec import json_loads
+
+DEFAULT_CACHE_FILE = 'apisure-cache.db'
+STORE_BATCH_SIZE = 500
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS results (
+        case_hash TEXT PRIMARY KEY,
+        passed INTEGER NOT NULL,
+        sets_cookies INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        updated REAL NOT NULL
+    );
+'''
+
+
+def case_hash(case: Dict[str, Any]) -> str:
+    # Everything in the definition counts: the request, the expectations and the description shown in the report
+    return hashlib.sha256(json.dumps(case, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class CachedResult:
+    """Outcome of a test case that was not sent again because its result from an earlier run was reused."""
+    __slots__ = ('case_hash',)
+
+    def __init__(self, case_hash: str) -> None:
+        self.case_hash = case_hash
+
+
+class ResultCache:
+    """
+    Results of earlier runs, keyed by a hash of the test case definition.
+
+    With ``changed_only`` a test case is only sent when its definition has no cached result, with ``failed_only``
+    when its cached result failed; with both, either is enough. Test cases that set cookies last time are always sent,
+    so the cases that run get a fresh session rather than a stale one.
+    """
+
+    def __init__(self, path: str, changed_only: bool = False, failed_only: bool = False) -> None:
+        self.path = path
+        self.changed_only = changed_only
+        self.failed_only = failed_only
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.executescript(SCHEMA)
+        # Only the flags are kept in memory; the stored results are read back when they are reused
+        self._index: Dict[str, Tuple[bool, bool]] = {
+            digest: (bool(passed), bool(sets_cookies))
+            for digest, passed, sets_cookies in self._connection.execute(
+                'SELECT case_hash, passed, sets_cookies FROM results')
+        }
+        self._pending: List[Tuple[str, int, int, str, float]] = []
+
+    @property
+    def selective(self) -> bool:
+        return self.changed_only or self.failed_only
+
+    def should_run(self, digest: str) -> bool:
+        if not self.selective:
+            return True
+        cached = self._index.get(digest)
+        if cached is None:
+            return True
+        passed, sets_cookies = cached
+        return sets_cookies or (self.failed_only and not passed)
+
+    def cached_result(self, digest: str) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute('SELECT result FROM results WHERE case_hash = ?', (digest,)).fetchone()
+        return json_loads(row[0]) if row else None
+
+    def store(self, digest: str, result: Dict[str, Any], sets_cookies: bool) -> None:
+        self._pending.append((digest, int(result['passed']), int(sets_cookies), json.dumps(result), time.time()))
+        if len(self._pending) >= STORE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', self._pending)
+        for digest, passed, sets_cookies, _, _ in self._pending:
+            self._index[digest] = (bool(passed), bool(sets_cookies))
+        self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+
+_result_cache: Optional[ResultCache] = None
+
+
+def configure_result_cache(path: Optional[str], changed_only: bool = False,
+                           failed_only: bool = False) -> Optional[ResultCache]:
+    global _result_cache
+    if _result_cache is not None:
+        _result_cache.close()
+    _result_cache = ResultCache(path, changed_only, failed_only) if path else None
+    return _result_cache
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    return _result_cache
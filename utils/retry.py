@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, RequestException, SSLError, Timeout
+
+# Statuses that say "try again later" rather than "this request is wrong"
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 30
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def error_status(error: RequestException) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+def is_retryable(error: RequestException) -> bool:
+    if isinstance(error, HTTPError):
+        return error_status(error) in RETRYABLE_STATUSES
+    return isinstance(error, (ConnectionError, Timeout, ChunkedEncodingError))
+
+
+def is_host_failure(error: RequestException) -> bool:
+    # Only a host that cannot be reached (a connection error, connect timeouts included) is down. Any answer, even a
+    # 5xx from one broken endpoint, a slow response or a failed TLS handshake, means the host is up
+    return isinstance(error, ConnectionError) and not isinstance(error, SSLError)
+
+
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a failed attempt.
+
+    Only connection errors, timeouts and the statuses in :data:`RETRYABLE_STATUSES` are retried. The wait grows
+    exponentially from ``delay`` with full jitter, so clients that failed together do not retry together. A
+    ``Retry-After`` header replaces the computed wait; if it asks for more than ``max_delay`` seconds there is no retry.
+    """
+
+    def __init__(self, retries: int = 3, delay: float = 2, max_delay: float = MAX_RETRY_DELAY) -> None:
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.delay * 2 ** (attempt - 1)))
+
+    def next_delay(self, attempt: int, error: RequestException) -> Optional[float]:
+        """Seconds to wait before the attempt after ``attempt`` (1-based), or ``None`` to give up."""
+        if attempt >= self.retries or not is_retryable(error):
+            return None
+        response = getattr(error, 'response', None)
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is None:
+            return self.backoff(attempt)
+        return retry_after if retry_after <= self.max_delay else None
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    After ``threshold`` consecutive host failures (connection errors and connect timeouts) the circuit for that host
+    opens and requests to it fail immediately. Once ``cooldown`` seconds have passed a single trial request is let
+    through: a success closes the circuit again, a failure keeps it open for another cooldown. A threshold of 0
+    disables the breaker.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._opened: Dict[str, float] = {}
+        self._trial: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def allow(self, host: str) -> bool:
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            opened = self._opened.get(host)
+            if opened is None:
+                return True
+            if self._trial.get(host) or time.monotonic() - opened < self.cooldown:
+                return False
+            self._trial[host] = True
+            return True
+
+    def record_success(self, host: str) -> None:
+        if host not in self._failures:
+            return
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened.pop(host, None)
+            self._trial.pop(host, None)
+
+    def abandon(self, host: str) -> None:
+        # A trial request that ended without telling whether the host is up keeps the circuit open for another cooldown
+        if not self._trial.get(host):
+            return
+        with self._lock:
+            if self._trial.pop(host, False):
+                self._opened[host] = time.monotonic()
+
+    def record_failure(self, host: str) -> None:
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._trial.pop(host, False) or self._failures[host] >= self.threshold:
+                self._opened[host] = time.monotonic()
+
+
+_circuit_breaker: Optional[CircuitBreaker] = None
+
+
+def configure_circuit_breaker(threshold: int = 5, cooldown: float = 30) -> CircuitBreaker:
+    global _circuit_breaker
+    _circuit_breaker = CircuitBreaker(threshold, cooldown)
+    return _circuit_breaker
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
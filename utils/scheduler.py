@@ -0,0 +1,95 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from helpers.output import print_error
+
+
+class _PendingCase:
+    __slots__ = ('index', 'case', 'after', 'future')
+
+    def __init__(self, index: int, case: Dict[str, Any], after: int) -> None:
+        self.index = index
+        self.case = case
+        self.after = after
+        self.future: Optional[Future] = None
+
+
+class CaseScheduler:
+    """
+    Runs test cases on a thread pool while yielding their outcomes in case order.
+
+    ``execute(case, state)`` performs the request for a single case and returns ``(outcome, state)``, where the
+    returned state (the Set-Cookie carry-over) is handed to every case that depends on it. A case waits for the
+    cases listed in its ``depends_on`` field and receives the state of the latest of them. With a concurrency of 1
+    every case implicitly depends on the one before it, which is the classic sequential behaviour.
+
+    Cases are given as ``(index, case)`` pairs in increasing index order; the indexes do not need to be contiguous, so
+    a shard of a suite keeps the numbering of the full suite.
+    """
+
+    def __init__(self, execute: Callable[[Dict[str, Any], Any], Tuple[Any, Any]], concurrency: int = 1,
+                 lookahead: Optional[int] = None) -> None:
+        self.execute = execute
+        self.concurrency = max(1, concurrency)
+        self.lookahead = lookahead or self.concurrency * 4
+
+    def _dependencies(self, index: int, case: Dict[str, Any], previous: int) -> List[int]:
+        if self.concurrency == 1:
+            return [previous] if previous else []
+
+        depends_on = case.get('depends_on', [])
+        if isinstance(depends_on, int):
+            depends_on = [depends_on]
+
+        dependencies = []
+        for dependency in depends_on:
+            if not isinstance(dependency, int) or not 1 <= dependency < index:
+                print_error(f"Test Case {index}: ignoring invalid dependency {dependency!r} "
+                            f"(must reference an earlier test case)")
+                continue
+            dependencies.append(dependency)
+        return dependencies
+
+    def run(self, test_cases: Iterable[Tuple[int, Dict[str, Any]]]) -> Iterator[Tuple[int, Dict[str, Any], Any]]:
+        states: Dict[int, Any] = {}
+        window: Deque[_PendingCase] = deque()
+        cases = iter(test_cases)
+        completed = 0
+        previous = 0
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit_ready() -> None:
+                for position, pending in enumerate(window):
+                    # Every earlier case of the input has finished once a case is at the head of the window, so a
+                    # dependency it still waits for is not part of the input (another shard has it) and never comes
+                    if pending.future is None and (pending.after <= completed or position == 0):
+                        pending.future = executor.submit(self.execute, pending.case, states.get(pending.after))
+
+            while True:
+                while not exhausted and len(window) < self.lookahead:
+                    try:
+                        index, case = next(cases)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    dependencies = self._dependencies(index, case, previous)
+                    window.append(_PendingCase(index, case, max(dependencies, default=0)))
+                    previous = index
+                submit_ready()
+
+                if not window:
+                    break
+
+                pending = window.popleft()
+                if pending.future is None:
+                    raise RuntimeError(f"Test Case {pending.index} was never submitted")
+                outcome, state = pending.future.result()
+                if self.concurrency == 1:
+                    states.pop(completed, None)
+                completed = pending.index
+                if state is not None:
+                    states[pending.index] = state
+
+                yield pending.index, pending.case, outcome
@@ -0,0 +1,172 @@
+import socket
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+
+from utils.timing import current_timing
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self) -> socket.socket:
+        timing = current_timing()
+        if timing is None:
+            return super()._new_conn()
+
+        # Resolve the host first so name resolution and the TCP handshake are timed separately
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)))
+        except socket.gaierror:
+            addresses = []
+        if not addresses:
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        timing.add('dns', resolved - started)
+
+        # Each address is tried once, in the order of the resolver, like urllib3 does with the host name
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except Exception as e:
+                    error = e
+            else:
+                raise error
+        finally:
+            self._dns_host = host
+        timing.add('connect', time.perf_counter() - resolved)
+        return sock
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self) -> None:
+        timing = current_timing()
+        if timing is None:
+            return super().connect()
+
+        started = time.perf_counter()
+        before = timing.phases['dns'] + timing.phases['connect']
+        super().connect()
+        # Whatever connect() spent beyond resolving and the TCP handshake went into the TLS handshake
+        timing.add('tls', time.perf_counter() - started - (timing.phases['dns'] + timing.phases['connect'] - before))
+
+
+class _CountingConnectionMixin:
+    # urllib3 only counts connection objects, which silently reconnect once the server closes them
+    num_connects = 0
+
+    def _make_request(self, conn: Any, *args: Any, **kwargs: Any) -> Any:
+        if conn.is_closed:
+            self.num_connects += 1
+
+        timing = current_timing()
+        if timing is None:
+            return super()._make_request(conn, *args, **kwargs)
+
+        started = time.perf_counter()
+        before = timing.phases['dns'] + timing.phases['connect'] + timing.phases['tls']
+        response = super()._make_request(conn, *args, **kwargs)
+        timing.headers_received = time.perf_counter()
+        setup = timing.phases['dns'] + timing.phases['connect'] + timing.phases['tls'] - before
+        timing.add('ttfb', timing.headers_received - started - setup)
+        return response
+
+
+class _CountingHTTPConnectionPool(_CountingConnectionMixin, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(_CountingConnectionMixin, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+class SessionPool:
+    def __init__(self, pool_size: int = 10, keep_alive: bool = True) -> None:
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self._sessions: Dict[Tuple[str, str], requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # Cookie carry-over between test cases is explicit, so the session must not keep its own cookie jar
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        adapter = PooledAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.netloc.lower())
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._sessions[key] = self._create_session()
+        return session
+
+    def connection_stats(self) -> Dict[str, int]:
+        stats = {'requests': 0, 'connections': 0}
+        for session in list(self._sessions.values()):
+            pools = session.get_adapter('http://').poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    stats['requests'] += pool.num_requests
+                    stats['connections'] += getattr(pool, 'num_connects', pool.num_connections)
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_session_pool: Optional[SessionPool] = None
+
+
+def configure_sessions(pool_size: int = 10, keep_alive: bool = True) -> SessionPool:
+    global _session_pool
+    if _session_pool is not None:
+        _session_pool.close()
+    _session_pool = SessionPool(pool_size, keep_alive)
+    return _session_pool
+
+
+def get_session_pool() -> SessionPool:
+    global _session_pool
+    if _session_pool is None:
+        _session_pool = SessionPool()
+    return _session_pool
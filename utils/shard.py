@@ -0,0 +1,84 @@
+import heapq
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from helpers.output import print_warning
+from utils.codec import json_loads
+
+SUMMARY_TOTALS = ('total_tests', 'pass', 'fail', 'executed', 'total_time', 'total_length', 'length_count', 'compared',
+                  'regressions', 'cached', 'throttled_time')
+CONNECTION_TOTALS = ('requests', 'connections', 'reused')
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        shard, shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected the form i/N (for example 2/4)")
+    if shards < 1 or not 1 <= shard <= shards:
+        raise ValueError(f"Invalid shard '{value}', i must be between 1 and N")
+    return shard, shards
+
+
+def select_shard(test_cases: Iterable[Dict[str, Any]], shard: int, shards: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield the ``(index, case)`` pairs of the 1-based ``shard`` out of ``shards``.
+
+    Cases are dealt round-robin by their position in the suite, which is stable as long as the suite is not
+    reordered. A case that lists others in ``depends_on`` goes to the shard of the first case of its dependency chain,
+    so it runs in the same process as the cases it needs. Cases are dealt as they are read, so a case that joins
+    chains already dealt to different shards can only follow the earliest; it runs without the others, with a warning.
+    """
+    roots: Dict[int, int] = {}
+    for index, case in enumerate(test_cases, start=1):
+        depends_on = case.get('depends_on', [])
+        if isinstance(depends_on, int):
+            depends_on = [depends_on]
+        dependency_roots = {dependency: roots.get(dependency, dependency) for dependency in depends_on
+                            if isinstance(dependency, int) and 1 <= dependency < index}
+        root = min(dependency_roots.values(), default=index)
+        if root != index:
+            roots[index] = root
+        if (root - 1) % shards == shard - 1:
+            elsewhere = sorted(dependency for dependency, dependency_root in dependency_roots.items()
+                               if (dependency_root - 1) % shards != shard - 1)
+            if elsewhere:
+                print_warning(f"Test Case {index}: depends on {elsewhere} from another shard, which this shard "
+                              f"does not run")
+            yield index, case
+
+
+def _read_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                yield json_loads(line)
+
+
+def read_partial_summary(path: str) -> Dict[str, Any]:
+    for record in _read_records(path):
+        if record.get('type') == 'summary':
+            return record
+    raise ValueError(f"Partial result file has no summary (did the shard finish?): {path}")
+
+
+def iter_partial_cases(path: str) -> Iterator[Dict[str, Any]]:
+    for record in _read_records(path):
+        if record.get('type') == 'test_case':
+            del record['type']
+            yield record
+
+
+def merge_partials(paths: List[str]) -> Tuple[Dict[str, Any], Dict[str, int], Iterator[Dict[str, Any]]]:
+    # Every partial file lists its test cases in suite order, so a k-way merge restores the order of the whole suite
+    # without loading the files
+    totals = dict.fromkeys(SUMMARY_TOTALS, 0)
+    connection_stats = dict.fromkeys(CONNECTION_TOTALS, 0)
+    for path in paths:
+        summary = read_partial_summary(path)
+        for key in SUMMARY_TOTALS:
+            totals[key] += summary['totals'].get(key, 0)
+        for key in CONNECTION_TOTALS:
+            connection_stats[key] += summary.get('connections', {}).get(key, 0)
+
+    test_cases = heapq.merge(*(iter_partial_cases(path) for path in paths), key=lambda case: case['id'])
+    return totals, connection_stats, test_cases
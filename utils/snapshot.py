@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.codec import json_dumps_canonical
+from utils.jsonpath import WILDCARD, Segment, format_segment, format_value, parse_path
+
+DEFAULT_SNAPSHOT_DIR = 'snapshots'
+MAX_DIFFERENCES = 10
+
+_REMOVED = object()
+
+
+def snapshot_key(case: Dict[str, Any]) -> str:
+    # Everything that shapes the response counts: the same URL with another Authorization header or another expected
+    # status gets a snapshot of its own
+    if 'snapshot_id' in case:
+        return str(case['snapshot_id'])
+    headers = {name.lower(): value for name, value in (case.get('headers') or {}).items()}
+    request = [case['method'].upper(), case['url'], case.get('params'), case.get('json'), headers,
+               case.get('expected_status')]
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def _without(value: Any, path: Tuple[Segment, ...]) -> Any:
+    # Copies only the containers on the way to a removed field, everything else is shared with the response
+    if not path:
+        return _REMOVED
+    head, rest = path[0], path[1:]
+    if isinstance(value, dict):
+        keys = list(value) if head == WILDCARD else [head] if head in value else []
+    elif isinstance(value, list):
+        if head == WILDCARD:
+            keys = range(len(value))
+        else:
+            keys = [head % len(value)] if isinstance(head, int) and -len(value) <= head < len(value) else []
+    else:
+        return value
+
+    result = None
+    for key in keys:
+        original = value[key]
+        if not rest:
+            item = _REMOVED
+        elif isinstance(original, (dict, list)):
+            item = _without(original, rest)
+            if item is original:
+                continue
+        else:
+            continue
+        if result is None:
+            result = dict(value) if isinstance(value, dict) else list(value)
+        if item is _REMOVED and isinstance(result, dict):
+            del result[key]
+        else:
+            # Removed array elements become null so the positions of the others do not shift
+            result[key] = None if item is _REMOVED else item
+    return value if result is None else result
+
+
+def normalize(value: Any, ignore_paths: Iterable[Tuple[Segment, ...]] = ()) -> Any:
+    for path in ignore_paths:
+        value = _without(value, path)
+        if value is _REMOVED:
+            return None
+    return value
+
+
+def diff(expected: Any, actual: Any, path: str = '$') -> Iterable[str]:
+    """Yield a line for every difference between the snapshot and the response, in document order."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key in sorted(expected.keys() | actual.keys()):
+            location = path + format_segment(key)
+            if key not in actual:
+                yield f"{location}: missing, was {format_value(expected[key])}"
+            elif key not in expected:
+                yield f"{location}: added {format_value(actual[key])}"
+            else:
+                yield from diff(expected[key], actual[key], location)
+    elif isinstance(expected, list) and isinstance(actual, list):
+        for position, (before, after) in enumerate(zip(expected, actual)):
+            yield from diff(before, after, f"{path}[{position}]")
+        for position in range(len(actual), len(expected)):
+            yield f"{path}[{position}]: missing, was {format_value(expected[position])}"
+        for position in range(len(expected), len(actual)):
+            yield f"{path}[{position}]: added {format_value(actual[position])}"
+    elif expected != actual or type(expected) is not type(actual):
+        yield f"{path}: {format_value(actual)} instead of {format_value(expected)}"
+
+
+class SnapshotStore:
+    """
+    Golden copies of JSON responses, stored content-addressed.
+
+    A response is normalized (the ignored paths removed) and hashed over its canonical JSON. Each test case has a small
+    reference file with the hash of its snapshot, and the snapshot itself is stored once per distinct content under
+    ``objects/``, so identical responses of many test cases share a file. An unchanged response is confirmed by
+    comparing the hash alone; the snapshot is only read back to diff a response that changed.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SNAPSHOT_DIR, update: bool = False,
+                 ignore_paths: Iterable[str] = ()) -> None:
+        self.directory = directory
+        self.update = update
+        self.ignore_paths = [parse_path(path) for path in ignore_paths]
+        os.makedirs(os.path.join(directory, 'cases'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+    def _reference_file(self, case: Dict[str, Any]) -> str:
+        name = hashlib.sha256(snapshot_key(case).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, 'cases', f"{name}.json")
+
+    def _object_file(self, digest: str) -> str:
+        return os.path.join(self.directory, 'objects', digest[:2], f"{digest}.json")
+
+    @staticmethod
+    def _write(path: str, text: str) -> None:
+        # Written next to the target and renamed, so workers writing the same snapshot never see a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_file = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temporary_file, path)
+
+    def _store(self, case: Dict[str, Any], reference_file: str, digest: str, value: Any) -> None:
+        object_file = self._object_file(digest)
+        if not os.path.exists(object_file):
+            self._write(object_file, json.dumps(value, sort_keys=True, indent=2, ensure_ascii=False) + '\n')
+        self._write(reference_file, json.dumps({
+            'method': case['method'],
+            'url': case['url'],
+            'description': case.get('description'),
+            'hash': digest,
+        }, indent=2) + '\n')
+
+    def check(self, case: Dict[str, Any], value: Any) -> Tuple[str, List[str]]:
+        """
+        Compare a decoded response with the snapshot of its test case. Returns ``matched``, ``recorded`` (there was
+        no snapshot yet), ``updated`` or ``changed``, and the differences for the last two.
+        """
+        try:
+            ignore_paths = self.ignore_paths + [parse_path(path) for path in case.get('snapshot_ignore', [])]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid snapshot_ignore: {e}")
+        value = normalize(value, ignore_paths)
+        # Sorted keys: the same content always hashes the same, whatever the order of the keys. Another JSON library
+        # may format numbers differently; such a snapshot diffs clean below and is re-stored under the new hash
+        digest = hashlib.sha256(json_dumps_canonical(value)).hexdigest()
+
+        reference_file = self._reference_file(case)
+        try:
+            with open(reference_file, 'r', encoding='utf-8') as file:
+                expected_digest = json.load(file)['hash']
+        except FileNotFoundError:
+            self._store(case, reference_file, digest, value)
+            return 'recorded', []
+        if digest == expected_digest:
+            return 'matched', []
+
+        try:
+            with open(self._object_file(expected_digest), 'r', encoding='utf-8') as file:
+                differences = list(diff(normalize(json.load(file), ignore_paths), value))
+        except FileNotFoundError:
+            differences = [f"$: snapshot {expected_digest} is missing from {self.directory}"]
+        if not differences:
+            # Only the ignored paths changed since the snapshot was taken; store it normalized like this response
+            self._store(case, reference_file, digest, value)
+            return 'matched', []
+        if self.update:
+            self._store(case, reference_file, digest, value)
+            return 'updated', differences
+        return 'changed', differences
+
+
+_snapshots: Optional[SnapshotStore] = None
+
+
+def configure_snapshots(directory: Optional[str], update: bool = False,
+                        ignore_paths: Iterable[str] = ()) -> Optional[SnapshotStore]:
+    global _snapshots
+    _snapshots = SnapshotStore(directory, update, ignore_paths) if directory else None
+    return _snapshots
+
+
+def get_snapshots() -> Optional[SnapshotStore]:
+    return _snapshots
@@ -0,0 +1,137 @@
+import csv
+import itertools
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.loader import JSON_LINES_EXTENSIONS, iter_json_array, iter_json_lines
+
+PLACEHOLDER = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+TEMPLATE_FIELDS = ('matrix', 'dataset')
+
+Render = Callable[[Dict[str, Any]], Any]
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def _lookup(variables: Dict[str, Any], name: str) -> Any:
+    try:
+        return variables[name]
+    except KeyError:
+        raise TemplateError(f"Unknown template variable '{name}', available: {', '.join(sorted(variables)) or 'none'}")
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value)
+
+
+def _compile(value: Any) -> Optional[Render]:
+    # None marks a part without placeholders, which every expanded test case shares instead of copying
+    if isinstance(value, str):
+        if '{{' not in value:
+            return None
+        whole = PLACEHOLDER.fullmatch(value)
+        if whole:
+            # A value that is only a placeholder takes the variable as is, so numbers stay numbers
+            name = whole.group(1)
+            return lambda variables: _lookup(variables, name)
+        # Alternating literal text and variable names, so rendering does not scan the string again
+        pieces = PLACEHOLDER.split(value)
+        literals, names = pieces[0::2], pieces[1::2]
+
+        def render(variables: Dict[str, Any]) -> str:
+            parts: List[str] = [literals[0]]
+            for name, literal in zip(names, literals[1:]):
+                parts.append(_format(_lookup(variables, name)))
+                parts.append(literal)
+            return ''.join(parts)
+        return render
+
+    if isinstance(value, dict):
+        parts = {key: _compile(item) for key, item in value.items()}
+        if all(part is None for part in parts.values()):
+            return None
+        return lambda variables: {key: value[key] if part is None else part(variables) for key, part in parts.items()}
+
+    if isinstance(value, list):
+        items = [_compile(item) for item in value]
+        if all(item is None for item in items):
+            return None
+        return lambda variables: [value[position] if item is None else item(variables)
+                                  for position, item in enumerate(items)]
+    return None
+
+
+def iter_dataset(path: str) -> Iterator[Dict[str, Any]]:
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', newline='') as file:
+        if extension == '.csv':
+            yield from csv.DictReader(file)
+        elif extension in JSON_LINES_EXTENSIONS:
+            yield from iter_json_lines(file)
+        elif extension == '.json':
+            yield from iter_json_array(file.read)
+        else:
+            raise TemplateError(f"Unsupported dataset '{path}', expected a .csv, .jsonl, .ndjson or .json file")
+
+
+class CaseTemplate:
+    """
+    A test case with ``{{name}}`` placeholders, expanded once per set of variables.
+
+    The variables come from the rows of ``dataset`` (a CSV file with a header row, JSON Lines, or a JSON array of
+    objects, relative to the test case file) and from every combination of the lists in ``matrix``; with both, each
+    row is combined with each matrix combination. Rows are read one at a time, so a dataset of any size is never held
+    in memory.
+    """
+
+    def __init__(self, case: Dict[str, Any], base_dir: str = '.') -> None:
+        matrix = case.get('matrix', {})
+        if not isinstance(matrix, dict) or not all(isinstance(values, list) for values in matrix.values()):
+            raise TemplateError("'matrix' must map each variable name to a list of values")
+        self.matrix = matrix
+        dataset = case.get('dataset')
+        self.dataset = os.path.join(base_dir, dataset) if dataset else None
+
+        template = {key: value for key, value in case.items() if key not in TEMPLATE_FIELDS}
+        self._template = template
+        self._render = _compile(template)
+
+    def combinations(self) -> Iterator[Dict[str, Any]]:
+        for values in itertools.product(*self.matrix.values()):
+            yield dict(zip(self.matrix, values))
+
+    def variables(self) -> Iterator[Dict[str, Any]]:
+        if self.dataset is None:
+            yield from self.combinations()
+            return
+        try:
+            for row in iter_dataset(self.dataset):
+                if not isinstance(row, dict):
+                    raise TemplateError(f"Dataset rows must be objects, got {row!r} in {self.dataset}")
+                for combination in self.combinations():
+                    yield {**row, **combination}
+        except OSError as e:
+            raise TemplateError(f"Cannot read dataset: {e}")
+        except json.JSONDecodeError as e:
+            raise TemplateError(f"Cannot parse dataset {self.dataset}: {e}")
+
+    def expand(self) -> Iterator[Dict[str, Any]]:
+        for variables in self.variables():
+            yield self._template if self._render is None else self._render(variables)
+
+
+def expand_test_cases(test_cases: Iterable[Dict[str, Any]], base_dir: str = '.') -> Iterator[Dict[str, Any]]:
+    """Yield the test cases with every template replaced by its expansion, generated as they are consumed."""
+    for case in test_cases:
+        if isinstance(case, dict) and any(field in case for field in TEMPLATE_FIELDS):
+            yield from CaseTemplate(case, base_dir).expand()
+        else:
+            yield case
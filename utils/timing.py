@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from helpers.formatting import format_time
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'download')
+PHASE_LABELS = {
+    'dns': 'DNS',
+    'connect': 'Connect',
+    'tls': 'TLS',
+    'ttfb': 'TTFB',
+    'download': 'Download',
+    'total': 'Total',
+}
+
+_local = threading.local()
+
+
+class RequestTiming:
+    """
+    Phase timings of a single request attempt.
+
+    The connection pool records DNS, connect and TLS time while it opens a connection and the time to the first byte
+    once the response headers arrive; :func:`finish_timing` adds the body download. Phases of a reused connection stay
+    at zero. Time spent waiting for the rate limiter before the attempt is kept apart in ``throttled`` and is not part
+    of the total.
+    """
+
+    def __init__(self, attempt: int) -> None:
+        self.attempt = attempt
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.started = time.perf_counter()
+        self.headers_received: Optional[float] = None
+        self.total = 0.0
+        self.error: Optional[str] = None
+        self.throttled = 0.0
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] += max(seconds, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        timing = dict(self.phases, attempt=self.attempt, total=self.total)
+        if self.error:
+            timing['error'] = self.error
+        if self.throttled:
+            timing['throttled'] = self.throttled
+        return timing
+
+
+def start_timing(attempt: int) -> RequestTiming:
+    _local.timing = RequestTiming(attempt)
+    return _local.timing
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return getattr(_local, 'timing', None)
+
+
+def finish_timing(timing: RequestTiming, error: Optional[Exception] = None) -> Dict[str, Any]:
+    finished = time.perf_counter()
+    if timing.headers_received is not None:
+        timing.add('download', finished - timing.headers_received)
+    timing.total = finished - timing.started
+    if error is not None:
+        timing.error = str(error)
+    _local.timing = None
+    return timing.to_dict()
+
+
+def format_timing(timing: Dict[str, Any]) -> str:
+    return ", ".join(f"{PHASE_LABELS[phase]} {format_time(timing.get(phase, 0))}" for phase in PHASES + ('total',))
+
+
+def check_timing_budget(timing: Dict[str, Any], budget: Dict[str, float]) -> List[str]:
+    # Budgets are given in milliseconds, like the other durations in a test case
+    failures = []
+    if not isinstance(budget, dict):
+        return [f"timing_budget must map phases to milliseconds, got {budget!r}"]
+    for phase, limit in budget.items():
+        if phase not in PHASE_LABELS:
+            failures.append(f"Unknown timing phase '{phase}' in timing_budget")
+        elif isinstance(limit, bool) or not isinstance(limit, (int, float)):
+            failures.append(f"Budget for '{phase}' in timing_budget must be a number of milliseconds, got {limit!r}")
+        elif timing.get(phase, 0) * 1000 > limit:
+            failures.append(f"{PHASE_LABELS[phase]} took {format_time(timing.get(phase, 0))}, "
+                            f"over the budget of {limit} ms")
+    return failures
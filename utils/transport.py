@@ -0,0 +1,228 @@
+import ssl
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests import exceptions
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from utils.body import CHUNK_SIZE, read_body, store_body
+from utils.session import get_session_pool
+from utils.timing import RequestTiming, current_timing
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class Transport(ABC):
+    """
+    Sends a single request attempt and downloads its body.
+
+    Every transport returns a :class:`requests.Response` with the body already read (see :func:`utils.body.store_body`)
+    and raises :class:`requests.RequestException` subclasses, so retries, validators and reports do not depend on the
+    transport. The phase timings of the attempt go into the :class:`utils.timing.RequestTiming` of the calling thread.
+    """
+    name = 'HTTP/1.1'
+
+    def prepare(self, url: str, verify_ssl: bool) -> None:
+        """Set up what a request to ``url`` needs before its timing starts."""
+
+    @abstractmethod
+    def send(self, method: str, url: str, timeout: Optional[float], verify_ssl: bool, max_body_size: int,
+             **kwargs: Any) -> requests.Response:
+        ...
+
+    @abstractmethod
+    def connection_stats(self) -> Dict[str, int]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class RequestsTransport(Transport):
+    """HTTP/1.1 through the pooled ``requests`` sessions of :mod:`utils.session`."""
+
+    def send(self, method: str, url: str, timeout: Optional[float], verify_ssl: bool, max_body_size: int,
+             **kwargs: Any) -> requests.Response:
+        session = get_session_pool().session_for(url)
+        response = session.request(method, url, timeout=timeout, verify=verify_ssl, stream=True, **kwargs)
+        read_body(response, max_body_size)
+        return response
+
+    def connection_stats(self) -> Dict[str, int]:
+        return get_session_pool().connection_stats()
+
+
+def _is_ssl_error(error: BaseException) -> bool:
+    while error is not None:
+        if isinstance(error, ssl.SSLError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _request_exception(error: Exception) -> exceptions.RequestException:
+    # The retry policy and the circuit breaker only know the exceptions of requests
+    if isinstance(error, httpx.ConnectTimeout):
+        return exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return exceptions.ReadTimeout(str(error))
+    if isinstance(error, httpx.ConnectError) and _is_ssl_error(error):
+        return exceptions.SSLError(str(error))
+    if isinstance(error, (httpx.NetworkError, httpx.ProtocolError, httpx.ProxyError)):
+        return exceptions.ConnectionError(str(error))
+    if isinstance(error, httpx.DecodingError):
+        return exceptions.ContentDecodingError(str(error))
+    if isinstance(error, httpx.TooManyRedirects):
+        return exceptions.TooManyRedirects(str(error))
+    if isinstance(error, httpx.UnsupportedProtocol):
+        return exceptions.InvalidSchema(str(error))
+    if isinstance(error, httpx.InvalidURL):
+        return exceptions.InvalidURL(str(error))
+    return exceptions.RequestException(str(error))
+
+
+class Http2Transport(Transport):
+    """
+    HTTP/2 through ``httpx``, which multiplexes concurrent requests to a host over a single connection.
+
+    HTTP/2 is negotiated with ALPN on HTTPS and falls back to HTTP/1.1 when the server does not offer it. Plain HTTP
+    uses HTTP/1.1 unless ``prior_knowledge`` is set, in which case it speaks HTTP/2 (h2c) right away. httpcore resolves
+    the host inside the TCP connect, so DNS time is part of the connect phase; the other phases are timed like the
+    ``requests`` transport.
+    """
+    name = 'HTTP/2'
+
+    def __init__(self, pool_size: int = 10, keep_alive: bool = True, prior_knowledge: bool = False) -> None:
+        self.limits = httpx.Limits(max_connections=pool_size,
+                                   max_keepalive_connections=pool_size if keep_alive else 0)
+        self.prior_knowledge = prior_knowledge
+        self._clients: Dict[Tuple[bool, bool], httpx.Client] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections = 0
+
+    def _client(self, url: str, verify_ssl: bool) -> httpx.Client:
+        cleartext_h2 = self.prior_knowledge and urlsplit(url).scheme.lower() == 'http'
+        key = (verify_ssl, cleartext_h2)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = httpx.Client(
+                        http1=not cleartext_h2, http2=True, verify=verify_ssl, limits=self.limits,
+                        follow_redirects=True)
+                    # Cookie carry-over between test cases is explicit, like in the requests sessions
+                    client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return client
+
+    def _trace(self, timing: Optional[RequestTiming]) -> Callable[[str, Dict[str, Any]], None]:
+        started: Dict[str, float] = {}
+
+        def trace(event: str, info: Dict[str, Any]) -> None:
+            now = time.perf_counter()
+            step, _, state = event.rpartition('.')
+            if state == 'started':
+                started[step] = now
+                return
+            if state != 'complete':
+                return
+            if step == 'connection.connect_tcp':
+                with self._lock:
+                    self._connections += 1
+            if timing is None:
+                return
+            if step == 'connection.connect_tcp':
+                timing.add('connect', now - started.get(step, now))
+            elif step == 'connection.start_tls':
+                timing.add('tls', now - started.get(step, now))
+            elif step.endswith('.receive_response_headers'):
+                protocol = step.partition('.')[0]
+                timing.add('ttfb', now - started.get(f"{protocol}.send_request_headers", started.get(step, now)))
+                timing.headers_received = now
+        return trace
+
+    def send(self, method: str, url: str, timeout: Optional[float], verify_ssl: bool, max_body_size: int,
+             **kwargs: Any) -> requests.Response:
+        data = kwargs.pop('data', None)
+        if isinstance(data, (str, bytes)):
+            kwargs['content'] = data
+        elif data is not None:
+            kwargs['data'] = data
+
+        timing = current_timing()
+        with self._lock:
+            self._requests += 1
+        try:
+            with self._client(url, verify_ssl).stream(method, url, timeout=timeout,
+                                                      extensions={'trace': self._trace(timing)},
+                                                      **kwargs) as streamed:
+                response = requests.Response()
+                response.status_code = streamed.status_code
+                response.reason = streamed.reason_phrase
+                response.url = str(streamed.url)
+                response.headers = CaseInsensitiveDict(streamed.headers)
+                response.encoding = get_encoding_from_headers(response.headers)
+                store_body(response, streamed.iter_bytes(CHUNK_SIZE), max_body_size)
+                response.wire_bytes = streamed.num_bytes_downloaded
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise _request_exception(e) from e
+
+        # Like requests, the elapsed time ends when the response headers arrive
+        if timing is not None and timing.headers_received is not None:
+            response.elapsed = timedelta(seconds=timing.headers_received - timing.started)
+        else:
+            response.elapsed = streamed.elapsed
+        return response
+
+    def prepare(self, url: str, verify_ssl: bool) -> None:
+        self._client(url, verify_ssl)
+
+    def connection_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {'requests': self._requests, 'connections': self._connections}
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+def http2_available() -> bool:
+    if httpx is None:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_transport: Transport = RequestsTransport()
+
+
+def configure_transport(http2: bool = False, pool_size: int = 10, keep_alive: bool = True,
+                        prior_knowledge: bool = False) -> Transport:
+    global _transport
+    if http2 and not http2_available():
+        raise ValueError("HTTP/2 needs httpx with HTTP/2 support: pip install 'httpx[http2]'")
+    _transport.close()
+    _transport = Http2Transport(pool_size, keep_alive, prior_knowledge) if http2 else RequestsTransport()
+    return _transport
+
+
+def get_transport() -> Transport:
+    return _transport
@@ -1,4 +1,24 @@
-from typing import Dict, Any, Tuple, Set
+import json
+import operator
+import re
+from functools import lru_cache
+from typing import Dict, Any, Tuple, Set, List, Optional, Callable, Iterable
+
+from utils.jsonpath import WILDCARD, Location, Segment, format_location, format_path, format_value, parse_path
+
+SchemaFailure = Tuple[str, Set[str], Set[str]]
+SchemaCheck = Callable[[Any], Optional[List[SchemaFailure]]]
+# Returns None when the value passes, otherwise what is wrong with it
+Check = Callable[[Any], Optional[str]]
+
+JSON_TYPES = {bool: 'boolean', int: 'integer', float: 'number', str: 'string', list: 'array', dict: 'object',
+              type(None): 'null'}
+# The JSON type names a type check accepts; an integer is also a number
+TYPE_NAMES = {name: {name} for name in JSON_TYPES.values()}
+TYPE_NAMES['number'] = {'integer', 'number'}
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+RECENT_ASSERTIONS = 1024
+OPERATORS = frozenset(['==', '!=', *COMPARISONS, 'type', 'in', 'matches', 'contains', 'length', 'exists'])
 
 
 def validate_schema(response: Dict[str, Any], schema: Dict[str, Any]) -> Tuple[Set[str], Set[str]]:
@@ -27,34 +47,413 @@ def validate_schema(response: Dict[str, Any], schema: Dict[str, Any]) -> Tuple[S
     return set(), set()
 
 
-def validate_content(response_json: Dict[str, Any], expected_content: Dict[str, Any]) -> Tuple[bool, str]:
-    for key, value in expected_content.items():
-        if key not in response_json:
-            return False, f"Key '{key}' not found in response"
-        if response_json[key] != value:
-            return False, f"Value mismatch for key '{key}': expected '{value}', got '{response_json[key]}'"
+class SchemaValidator:
+    """
+    ``expected_schema`` compiled into nested closures, so the schema dict is only walked once.
+
+    Unlike :func:`validate_schema`, every element of an array is checked, and :meth:`validate` also returns the path of
+    each failing object, such as ``$[12].address``. Each node compiles to a cheap pass/fail predicate and a detailed
+    check; the detailed check only runs on values the predicate rejects.
+    """
+
+    def __init__(self, schema: Dict[str, Any]) -> None:
+        self.schema = schema
+        compiled = self._compile(schema)
+        self._is_valid, self._check = compiled if compiled else (None, None)
+
+    def _compile(self, schema: Dict[str, Any]) -> Optional[Tuple[Callable[[Any], bool], SchemaCheck]]:
+        if schema.get('type') == 'object':
+            properties = schema.get('properties', {})
+            allowed = frozenset(properties)
+            required = frozenset(schema.get('required', []))
+            nested = [(key, compiled) for key, compiled in
+                      ((key, self._compile(value)) for key, value in properties.items()) if compiled]
+            nested_predicates = tuple((key, is_valid) for key, (is_valid, _) in nested)
+
+            def is_valid_object(value: Any) -> bool:
+                if not isinstance(value, dict):
+                    return True
+                keys = value.keys()
+                # Subset comparisons with dict views do not allocate, so a passing object builds no sets
+                if not (keys <= allowed and required <= keys):
+                    return False
+                for key, is_valid in nested_predicates:
+                    if key in value and not is_valid(value[key]):
+                        return False
+                return True
+
+            def check_object(value: Any) -> Optional[List[SchemaFailure]]:
+                if is_valid_object(value):
+                    return None
+                keys = value.keys()
+                missing = required - keys
+                extra = keys - allowed
+                failures = [('', set(missing), extra)] if missing or extra else []
+                for key, (_, nested_check) in nested:
+                    if key in value:
+                        nested_failures = nested_check(value[key])
+                        if nested_failures:
+                            failures.extend((f".{key}{path}", m, e) for path, m, e in nested_failures)
+                return failures
+
+            return is_valid_object, check_object
+
+        if schema.get('type') == 'array':
+            compiled_items = self._compile(schema.get('items', {}))
+            if compiled_items is None:
+                return None
+            is_valid_item, check_item = compiled_items
+
+            def is_valid_array(value: Any) -> bool:
+                return not isinstance(value, list) or all(map(is_valid_item, value))
+
+            def check_array(value: Any) -> Optional[List[SchemaFailure]]:
+                if is_valid_array(value):
+                    return None
+                return [(f"[{position}]{path}", m, e)
+                        for position, item in enumerate(value) if not is_valid_item(item)
+                        for path, m, e in check_item(item)]
+
+            return is_valid_array, check_array
+
+        return None
+
+    def validate(self, response: Any) -> Tuple[Set[str], Set[str], List[str]]:
+        if self._is_valid is None or self._is_valid(response):
+            return set(), set(), []
+        return self._summarize(self._check(response))
+
+    def validate_elements(self, elements: Iterable[Any]) -> Tuple[Set[str], Set[str], List[str], int]:
+        # For a top-level array that is parsed one element at a time; also returns the number of elements
+        compiled_items = self._compile(self.schema.get('items', {})) if self.schema.get('type') == 'array' else None
+        if compiled_items is None:
+            return set(), set(), [], sum(1 for _ in elements)
+
+        is_valid_item, check_item = compiled_items
+        failures: List[SchemaFailure] = []
+        count = 0
+        for position, item in enumerate(elements):
+            count += 1
+            if not is_valid_item(item):
+                failures.extend((f"[{position}]{path}", m, e) for path, m, e in check_item(item))
+        return (*self._summarize(failures), count)
+
+    @staticmethod
+    def _summarize(failures: Iterable[SchemaFailure]) -> Tuple[Set[str], Set[str], List[str]]:
+        missing_keys: Set[str] = set()
+        extra_keys: Set[str] = set()
+        failing_paths = []
+        for path, missing, extra in failures:
+            missing_keys.update(missing)
+            extra_keys.update(extra)
+            details = []
+            if missing:
+                details.append(f"missing {sorted(missing)}")
+            if extra:
+                details.append(f"extra {sorted(extra)}")
+            failing_paths.append(f"${path}: {', '.join(details)}")
+        return missing_keys, extra_keys, failing_paths
+
+
+@lru_cache(maxsize=256)
+def _compile_schema(schema_key: str) -> SchemaValidator:
+    return SchemaValidator(json.loads(schema_key))
+
+
+def compile_schema(schema: Dict[str, Any]) -> SchemaValidator:
+    return _compile_schema(json.dumps(schema, sort_keys=True))
+
+
+class InvalidAssertion(ValueError):
+    pass
+
+
+def json_type(value: Any) -> str:
+    return JSON_TYPES.get(type(value), type(value).__name__)
+
+
+def _same(value: Any, expected: Any) -> bool:
+    # True == 1 in Python, but not in JSON
+    return value == expected and (type(value) is bool) == (type(expected) is bool)
+
+
+def _compile_operator(name: str, expected: Any) -> Check:
+    if name == '==':
+        return lambda value: None if _same(value, expected) else \
+            f"expected {format_value(expected)}, got {format_value(value)}"
+    if name == '!=':
+        return lambda value: f"expected anything but {format_value(expected)}" if _same(value, expected) else None
+
+    if name in COMPARISONS:
+        compare = COMPARISONS[name]
+
+        def check_comparison(value: Any) -> Optional[str]:
+            try:
+                if compare(value, expected):
+                    return None
+            except TypeError:
+                pass
+            return f"expected {name} {format_value(expected)}, got {format_value(value)}"
+        return check_comparison
+
+    if name == 'type':
+        names = [expected] if isinstance(expected, str) else expected
+        if not isinstance(names, list) or not names or any(type_name not in TYPE_NAMES for type_name in names):
+            raise InvalidAssertion(f"'type' must be one of {', '.join(TYPE_NAMES)} or a list of them, "
+                                   f"got {format_value(expected)}")
+        allowed = frozenset().union(*(TYPE_NAMES[type_name] for type_name in names))
+        description = ' or '.join(names)
+        return lambda value: None if JSON_TYPES.get(type(value)) in allowed else \
+            f"expected type {description}, got {json_type(value)}"
+
+    if name == 'in':
+        if not isinstance(expected, list):
+            raise InvalidAssertion(f"'in' must be a list of values, got {format_value(expected)}")
+        return lambda value: None if any(_same(value, option) for option in expected) else \
+            f"expected one of {format_value(expected)}, got {format_value(value)}"
+
+    if name == 'matches':
+        try:
+            pattern = re.compile(expected)
+        except (TypeError, re.error) as e:
+            raise InvalidAssertion(f"'matches' must be a regular expression, got {format_value(expected)}: {e}")
+        return lambda value: None if isinstance(value, str) and pattern.search(value) else \
+            f"expected to match {format_value(expected)}, got {format_value(value)}"
+
+    if name == 'contains':
+        def check_contains(value: Any) -> Optional[str]:
+            # An element of an array, a key of an object, or a substring
+            if isinstance(value, list) and any(_same(item, expected) for item in value):
+                return None
+            if isinstance(value, (dict, str)) and isinstance(expected, str) and expected in value:
+                return None
+            return f"expected to contain {format_value(expected)}, got {format_value(value)}"
+        return check_contains
+
+    if name == 'length':
+        _, length_checks = _compile_spec(expected)
+
+        def check_length(value: Any) -> Optional[str]:
+            if not isinstance(value, (list, dict, str)):
+                return f"expected an array, object or string, got {json_type(value)}"
+            length = len(value)
+            for length_check in length_checks:
+                message = length_check(length)
+                if message is not None:
+                    return f"length {message}"
+            return None
+        return check_length
+
+    raise InvalidAssertion(f"Unknown operator '{name}'")
+
+
+def _compile_spec(spec: Any) -> Tuple[bool, List[Check]]:
+    # An object whose keys are all operators is a set of checks; any other value is compared for equality
+    if not (isinstance(spec, dict) and spec and spec.keys() <= OPERATORS):
+        spec = {'==': spec}
+    exists = spec.get('exists', True)
+    if not isinstance(exists, bool):
+        raise InvalidAssertion(f"'exists' must be true or false, got {format_value(exists)}")
+    return exists, [_compile_operator(name, expected) for name, expected in spec.items() if name != 'exists']
+
+
+class _PathNode:
+    __slots__ = ('checks', 'children', 'required')
+
+    def __init__(self) -> None:
+        # (exists, checks) of the assertions on exactly this path
+        self.checks: List[Tuple[bool, List[Check]]] = []
+        self.children: Dict[Segment, '_PathNode'] = {}
+        # The rest of the path of every assertion below this node that expects its value to exist
+        self.required: List[Tuple[Segment, ...]] = []
+
+
+Visit = Callable[[Any, Location, List[str]], None]
+_MISSING = object()
+
+
+def _not_found(node: _PathNode, location: Location, failures: List[str]) -> None:
+    for rest in node.required:
+        failures.append(f"{format_location(location, rest)}: not found")
+
+
+def _compile_node(node: _PathNode) -> Visit:
+    checks = tuple(check for exists, node_checks in node.checks if exists for check in node_checks)
+    absent = not all(exists for exists, _ in node.checks)
+    steps = tuple(_compile_step(segment, child) for segment, child in node.children.items())
+
+    def visit(value: Any, location: Location, failures: List[str]) -> None:
+        if absent:
+            failures.append(f"{format_location(location)}: expected to be absent, got {format_value(value)}")
+        for check in checks:
+            message = check(value)
+            if message is not None:
+                failures.append(f"{format_location(location)}: {message}")
+        for step in steps:
+            step(value, location, failures)
+    return visit
+
+
+def _compile_step(segment: Segment, child: _PathNode) -> Visit:
+    # Moves from a value to the values at the next segment of the path and visits them
+    visit_child = _compile_node(child)
+
+    if segment == WILDCARD:
+        def step_all(value: Any, location: Location, failures: List[str]) -> None:
+            if isinstance(value, list):
+                for position, item in enumerate(value):
+                    visit_child(item, (location, position), failures)
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    visit_child(item, (location, key), failures)
+            else:
+                _not_found(child, (location, segment), failures)
+        return step_all
+
+    if isinstance(segment, int):
+        def step_index(value: Any, location: Location, failures: List[str]) -> None:
+            if isinstance(value, list) and -len(value) <= segment < len(value):
+                visit_child(value[segment], (location, segment % len(value)), failures)
+            else:
+                _not_found(child, (location, segment), failures)
+        return step_index
+
+    if not child.children and all(exists for exists, _ in child.checks):
+        # The last segment of a path: the checks run here, which saves a call per value on wide arrays
+        checks = tuple(check for _, node_checks in child.checks for check in node_checks)
+
+        def step_leaf(value: Any, location: Location, failures: List[str]) -> None:
+            item = value.get(segment, _MISSING) if isinstance(value, dict) else _MISSING
+            if item is _MISSING:
+                _not_found(child, (location, segment), failures)
+                return
+            for check in checks:
+                message = check(item)
+                if message is not None:
+                    failures.append(f"{format_location((location, segment))}: {message}")
+        return step_leaf
+
+    def step_key(value: Any, location: Location, failures: List[str]) -> None:
+        item = value.get(segment, _MISSING) if isinstance(value, dict) else _MISSING
+        if item is _MISSING:
+            _not_found(child, (location, segment), failures)
+        else:
+            visit_child(item, (location, segment), failures)
+    return step_key
+
+
+class AssertionValidator:
+    """
+    Assertions on the values at paths of a JSON response, such as ``{"$.items[*].price": {">": 0}}``, compiled once.
+
+    The paths of all assertions are merged into a tree, so the response is walked once however many assertions share
+    a prefix, and every failing value is reported with its concrete path, such as ``$.items[3].price``, rather than
+    only the first. A path with ``[*]`` applies its checks to every element; a path that does not exist fails unless
+    the assertion is ``{"exists": false}``.
+    """
+
+    def __init__(self, assertions: Dict[str, Any]) -> None:
+        self.assertions = assertions
+        self._root = _PathNode()
+        for path, spec in assertions.items():
+            try:
+                segments = parse_path(path)
+            except ValueError as e:
+                raise InvalidAssertion(str(e))
+            exists, checks = _compile_spec(spec)
+
+            node = self._root
+            for depth, segment in enumerate(segments):
+                node = node.children.setdefault(segment, _PathNode())
+                if exists:
+                    node.required.append(segments[depth + 1:])
+            node.checks.append((exists, checks))
+        self._visit = _compile_node(self._root)
+
+    def validate(self, response: Any) -> List[str]:
+        failures: List[str] = []
+        self._visit(response, None, failures)
+        return failures
+
+
+@lru_cache(maxsize=256)
+def _compile_assertions(assertions_key: str) -> AssertionValidator:
+    return AssertionValidator(json.loads(assertions_key))
+
+
+_recent_assertions: Dict[Tuple[str, int], Tuple[Any, AssertionValidator]] = {}
+
+
+def _compiled(kind: str, spec: Dict[str, Any],
+              to_assertions: Callable[[Dict[str, Any]], Dict[str, Any]]) -> AssertionValidator:
+    # A test case keeps the same expectation objects for the whole run, and so do all expansions of a template, so
+    # most lookups are by identity and do not serialize the expectations again
+    cached = _recent_assertions.get((kind, id(spec)))
+    if cached is not None and cached[0] is spec:
+        return cached[1]
+    if not isinstance(spec, dict):
+        raise InvalidAssertion(f"'{kind}' must map paths to expected values")
+    validator = _compile_assertions(json.dumps(to_assertions(spec), sort_keys=True))
+    if len(_recent_assertions) >= RECENT_ASSERTIONS:
+        _recent_assertions.clear()
+    _recent_assertions[(kind, id(spec))] = (spec, validator)
+    return validator
+
+
+def compile_assertions(assertions: Dict[str, Any]) -> AssertionValidator:
+    return _compiled('assertions', assertions, lambda spec: spec)
+
+
+def _key_path(key: str) -> str:
+    # Keys of expected_content and expected_types are top-level keys unless they are written as paths
+    return key if key.startswith('$') else format_path((key,))
+
+
+def _content_assertions(expected_content: Dict[str, Any]) -> Dict[str, Any]:
+    return {_key_path(key): {'==': value} for key, value in expected_content.items()}
+
+
+def _type_assertions(expected_types: Dict[str, Any]) -> Dict[str, Any]:
+    # Type names as in the test case file, or Python types such as int
+    return {_key_path(key): {'type': JSON_TYPES.get(expected_type, expected_type.__name__)
+                             if isinstance(expected_type, type) else expected_type}
+            for key, expected_type in expected_types.items()}
+
+
+def validate_content(response_json: Any, expected_content: Dict[str, Any]) -> Tuple[bool, str]:
+    try:
+        failures = _compiled('expected_content', expected_content, _content_assertions).validate(response_json)
+    except InvalidAssertion as e:
+        return False, str(e)
+    if failures:
+        return False, '; '.join(failures)
     return True, "Content validation passed"
 
 
-def validate_content_type(response_json: Dict[str, Any], expected_types: Dict[str, type]) -> Tuple[bool, str]:
-    for key, expected_type in expected_types.items():
-        if key not in response_json:
-            return False, f"Key '{key}' not found in response"
-        if not isinstance(response_json[key], expected_type):
-            return False, f"Type mismatch for key '{key}': expected {expected_type.__name__}, got {type(response_json[key]).__name__}"
+def validate_content_type(response_json: Any, expected_types: Dict[str, Any]) -> Tuple[bool, str]:
+    try:
+        failures = _compiled('expected_types', expected_types, _type_assertions).validate(response_json)
+    except InvalidAssertion as e:
+        return False, str(e)
+    if failures:
+        return False, '; '.join(failures)
     return True, "Content type validation passed"
 
 
 def validate_headers(response_headers: Dict[str, str], expected_headers: Dict[str, str],
                      forbidden_headers: list[str]) -> Tuple[bool, str]:
+    failures = []
     for header, value in expected_headers.items():
-        if header not in response_headers:
-            return False, f"Expected header '{header}' not found"
-        if response_headers[header] != value:
-            return False, f"Header '{header}' value mismatch: expected '{value}', got '{response_headers[header]}'"
+        actual = response_headers.get(header)
+        if actual is None:
+            failures.append(f"Expected header '{header}' not found")
+        elif actual != value:
+            failures.append(f"Header '{header}' value mismatch: expected '{value}', got '{actual}'")
 
     for header in forbidden_headers:
         if header in response_headers:
-            return False, f"Forbidden header '{header}' found in response"
+            failures.append(f"Forbidden header '{header}' found in response")
 
+    if failures:
+        return False, '; '.join(failures)
     return True, "Header validation passed"